@@ -0,0 +1,67 @@
+# Compares extraction of Camt053 entries once per statement (Camt053._process_stmts) with the former double
+# extraction, where the entries of every statement were extracted once for the statement summary and once more
+# for the transactions. Files with several statements are generated (see synthetic.py):
+#     python benchmarks/camt053_single_pass.py [--statements 1 10 50] [--entries 1000]
+import argparse
+import time
+
+from kktools.ISO20022 import BALANCE_COLUMNS, Camt053, parse_xml_file
+from synthetic import camt053_document
+
+
+def extract_twice(camt, stmt_list):
+    # _process_stmts as it was before entries were extracted once per statement
+    statements_info = []
+    camt._transactions = []
+    for stmt in stmt_list:
+        stmt_info, balances = camt._process_stmt_header(stmt)
+        camt._add_balances(len(statements_info), balances)
+        stmt_info.update(camt._get_summary_per_stmt(camt._get_transactions_per_stmt(stmt)))
+        statements_info.append(stmt_info)
+
+        stmt_header_main = camt._stmt_header_main(stmt)
+        camt._transactions += [camt._make_transaction(values, stmt_header_main)
+                               for values in camt._get_transactions_per_stmt(stmt)]
+    return statements_info
+
+
+def extract_once(camt, stmt_list):
+    camt._transactions = None
+    return camt._process_stmts(stmt_list)
+
+
+def best_time(extract, camt, stmt_list, repeat):
+    timings = []
+    for _ in range(repeat):
+        camt.balances = {col: [] for col in BALANCE_COLUMNS}
+        start = time.perf_counter()
+        statements_info = extract(camt, stmt_list)
+        timings.append(time.perf_counter() - start)
+    return min(timings), statements_info, camt._transactions
+
+
+def run(statement_counts, n_entries, repeat):
+    print(f'{"statements":>10} {"entries":>9} {"twice ms":>10} {"once ms":>9} {"speedup":>8}')
+    for n_statements in statement_counts:
+        document = camt053_document(n_statements, n_entries)
+        camt = Camt053(document)
+        stmt_list = parse_xml_file(document).xpath('.//Stmt')
+
+        twice, twice_info, twice_transactions = best_time(extract_twice, camt, stmt_list, repeat)
+        once, once_info, once_transactions = best_time(extract_once, camt, stmt_list, repeat)
+
+        # both ways have to give the same statements and transactions
+        assert once_info == twice_info and once_transactions == twice_transactions, n_statements
+
+        print(f'{n_statements:10} {len(once_transactions):9,} {twice * 1e3:10.1f} {once * 1e3:9.1f} '
+              f'{twice / once:7.2f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of single pass extraction of Camt053 entries')
+    parser.add_argument('--statements', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--entries', type=int, default=1000, help='entries per statement')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    run(args.statements, args.entries, args.repeat)
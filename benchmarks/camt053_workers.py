@@ -0,0 +1,53 @@
+# Compares parsing of a folder of CAMT053 files by process_CAMT053_folder in one process and in a pool of
+# worker processes (workers=). Files are generated into a temporary folder (see synthetic.py):
+#     python benchmarks/camt053_workers.py [--files 200] [--workers 2 4]
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from kktools.ISO20022 import STATEMENT_HEADER_COLUMNS, Camt053, process_CAMT053_folder
+from synthetic import camt053_document
+
+
+def expected_transactions(folder):
+    # transactions of all files as dicts, the way a Camt053 without columnar storage gives them
+    transactions = []
+    for file_name in os.listdir(folder):
+        transactions += Camt053(os.path.join(folder, file_name)).transactions
+    return pd.DataFrame(transactions)
+
+
+def run(n_files, n_statements, n_entries, worker_counts):
+    with tempfile.TemporaryDirectory() as folder:
+        for i in range(n_files):
+            with open(os.path.join(folder, f'camt053_{i:05d}.xml'), 'wb') as f:
+                f.write(camt053_document(n_statements, n_entries, seed=i))
+
+        expected = expected_transactions(folder)
+
+        print(f'{"workers":>7} {"files":>7} {"transactions":>12} {"seconds":>8}')
+        for workers in [None] + worker_counts:
+            start = time.perf_counter()
+            df_files, df_statements, df_transactions = process_CAMT053_folder(folder, workers=workers)
+            elapsed = time.perf_counter() - start
+
+            # statement header columns have to match the dict transactions, including empty fields
+            # (statements with <Acct><Nm/></Acct> have no Account_owner)
+            for col in STATEMENT_HEADER_COLUMNS:
+                assert df_transactions[col].tolist() == expected[col].tolist(), (workers, col)
+
+            print(f'{workers or 1:7} {len(df_files):7,} {len(df_transactions):12,} {elapsed:8.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of parallel parsing of CAMT053 folders')
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--statements', type=int, default=4, help='statements per file')
+    parser.add_argument('--entries', type=int, default=100, help='entries per statement')
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4])
+    args = parser.parse_args()
+
+    run(args.files, args.statements, args.entries, args.workers)
@@ -0,0 +1,121 @@
+# Local stand-in for the ECB SDMX REST API (data/EXR/D.<CUR[+CUR]>.EUR.SP00.A) with generated daily rates,
+# so that ECB benchmarks can record their fixtures without network access. Answers SDMX generic data XML or,
+# with format=csvdata, SDMX-CSV, gzip compressed when the client accepts it, like the ECB service.
+import datetime
+import gzip
+import random
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CURRENCIES = ('USD', 'JPY', 'BGN', 'CZK', 'DKK', 'GBP', 'HUF', 'PLN', 'RON', 'SEK', 'CHF', 'ISK', 'NOK', 'TRY', 'AUD',
+              'BRL', 'CAD', 'CNY', 'HKD', 'IDR', 'ILS', 'INR', 'KRW', 'MXN', 'MYR', 'NZD', 'PHP', 'SGD', 'THB', 'ZAR')
+FIRST_DAY = datetime.date(1999, 1, 4)
+LAST_DAY = datetime.date(2024, 12, 31)
+
+XML_HEAD = ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<message:GenericData xmlns:message="http://www.sdmx.org/resources/sdmxml/schemas/v2_1/message" '
+            'xmlns:common="http://www.sdmx.org/resources/sdmxml/schemas/v2_1/common" '
+            'xmlns:generic="http://www.sdmx.org/resources/sdmxml/schemas/v2_1/data/generic">'
+            '<message:Header><message:ID>stub</message:ID><message:Test>false</message:Test>'
+            '<message:Sender id="ECB"/></message:Header><message:DataSet action="Replace" structureRef="ECB_EXR1">')
+CSV_HEAD = ('KEY,FREQ,CURRENCY,CURRENCY_DENOM,EXR_TYPE,EXR_SUFFIX,TIME_PERIOD,OBS_VALUE,OBS_STATUS,OBS_CONF,'
+            'DECIMALS,SOURCE_AGENCY,TITLE,TITLE_COMPL,UNIT,UNIT_MULT')
+
+
+def business_days():
+    day = FIRST_DAY
+    while day <= LAST_DAY:
+        if day.weekday() < 5:
+            yield day.isoformat()
+        day += datetime.timedelta(days=1)
+
+
+DAYS = tuple(business_days())
+
+
+def observations(currency, query):
+    # deterministic rates per currency, with an occasional missing observation (NaN) as ECB has on holidays
+    base = random.Random(currency).uniform(0.5, 150)
+    days = DAYS
+    if 'startPeriod' in query:
+        days = [day for day in days if day >= query['startPeriod']]
+    if 'endPeriod' in query:
+        days = [day for day in days if day <= query['endPeriod']]
+    if 'lastNObservations' in query:
+        days = days[-int(query['lastNObservations']):]
+    obs = []
+    for day in days:
+        noise = zlib.crc32((currency + day).encode())
+        obs.append((day, 'NaN' if noise % 997 == 0 else f'{base * (1 + noise % 1000 / 10000):.4f}'))
+    return obs
+
+
+def xml_body(data):
+    parts = [XML_HEAD]
+    for currency, obs in data:
+        parts.append('<generic:Series><generic:SeriesKey><generic:Value id="FREQ" value="D"/>'
+                     f'<generic:Value id="CURRENCY" value="{currency}"/><generic:Value id="CURRENCY_DENOM" value="EUR"/>'
+                     '<generic:Value id="EXR_TYPE" value="SP00"/><generic:Value id="EXR_SUFFIX" value="A"/>'
+                     '</generic:SeriesKey><generic:Attributes><generic:Value id="DECIMALS" value="4"/>'
+                     f'<generic:Value id="TITLE" value="{currency}/Euro"/></generic:Attributes>')
+        parts.extend(f'<generic:Obs><generic:ObsDimension value="{day}"/><generic:ObsValue value="{value}"/>'
+                     '<generic:Attributes><generic:Value id="OBS_STATUS" value="A"/>'
+                     '<generic:Value id="OBS_CONF" value="F"/></generic:Attributes></generic:Obs>'
+                     for day, value in obs)
+        parts.append('</generic:Series>')
+    parts.append('</message:DataSet></message:GenericData>')
+    return ''.join(parts).encode()
+
+
+def csv_body(data):
+    lines = [CSV_HEAD]
+    for currency, obs in data:
+        lines.extend(f'EXR.D.{currency}.EUR.SP00.A,D,{currency},EUR,SP00,A,{day},{"" if value == "NaN" else value},'
+                     f'A,F,4,4F0,{currency}/Euro,"ECB reference exchange rate, {currency}/Euro",{currency},0'
+                     for day, value in obs)
+    return ('\n'.join(lines) + '\n').encode()
+
+
+class EcbStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        key = url.path.rpartition('/')[2].split('.')
+        currencies = key[1].split('+') if len(key) > 1 and key[1] else CURRENCIES
+        data = [(currency, observations(currency, query)) for currency in currencies if currency in CURRENCIES]
+        data = [(currency, obs) for currency, obs in data if obs]
+        if not data:
+            return self.reply(404, b'No results found.', 'text/plain')
+
+        if query.get('format') == 'csvdata':
+            body, content_type = csv_body(data), 'text/csv'
+        else:
+            body, content_type = xml_body(data), 'application/vnd.sdmx.genericdata+xml;version=2.1'
+        compressed = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if compressed:
+            body = gzip.compress(body)
+        self.reply(200, body, content_type, compressed)
+
+    def reply(self, status, body, content_type, compressed=False):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if compressed:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_stub():
+    # serves the stub on a free local port in a background thread, returns the server and its entrypoint;
+    # server.shutdown() stops it
+    server = ThreadingHTTPServer(('127.0.0.1', 0), EcbStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/service/'
@@ -0,0 +1,104 @@
+# Compares ECB wire formats (see kktools.core.ECB_WIRE_FORMATS): bytes transferred and parse time per format.
+#
+# Responses are recorded once as they are received on the wire (compressed bodies stay compressed):
+#     python benchmarks/ecb_wire_formats.py --record [--entrypoint URL]
+# and later runs replay the recorded fixtures without network access:
+#     python benchmarks/ecb_wire_formats.py
+# Without recorded fixtures (or with --stub) they are recorded from a local stand-in of the ECB service with
+# generated rates (see ecb_stub.py), so the benchmark also runs offline; fixtures are not committed.
+import argparse
+import gzip
+import io
+import os
+import time
+
+import numpy as np
+
+from kktools.core import ECB_ENTRYPOINT, ECB_WIRE_FORMATS, get_ecb_session, parse_ecb_csv, parse_ecb_series
+from ecb_stub import start_stub
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'ecb')
+
+# name: (SDMX key, query parameters)
+QUERIES = {
+    'usd_since_1999': ('D.USD.EUR.SP00.A', {'startPeriod': '1999-01-01'}),
+    'majors_since_2010': ('D.USD+GBP+JPY+CHF.EUR.SP00.A', {'startPeriod': '2010-01-01'}),
+    'last_all': ('D..EUR.SP00.A', {'lastNObservations': 1}),
+}
+
+
+def fixture_path(name, wire_format):
+    return os.path.join(FIXTURES, name + '.' + wire_format)
+
+
+def record(entrypoint):
+    os.makedirs(FIXTURES, exist_ok=True)
+    session = get_ecb_session()
+    for name, (key, parameters) in QUERIES.items():
+        for wire_format in ECB_WIRE_FORMATS:
+            data_format, _, compression = wire_format.partition('.')
+            query = dict(parameters, format='csvdata') if data_format == 'csv' else parameters
+            headers = {'Accept-Encoding': 'gzip' if compression else 'identity'}
+            with session.get(entrypoint + 'data/EXR/' + key, params=query, headers=headers, stream=True) as response:
+                response.raise_for_status()
+                body = response.raw.read(decode_content=False)
+            with open(fixture_path(name, wire_format), 'wb') as f:
+                f.write(body)
+
+
+def record_from_stub():
+    server, entrypoint = start_stub()
+    try:
+        record(entrypoint)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def fixtures_recorded():
+    return all(os.path.exists(fixture_path(name, wire_format))
+               for name in QUERIES for wire_format in ECB_WIRE_FORMATS)
+
+
+def parse_fixture(body, wire_format):
+    data_format, _, compression = wire_format.partition('.')
+    source = gzip.GzipFile(fileobj=io.BytesIO(body)) if compression else io.BytesIO(body)
+    return parse_ecb_csv(source) if data_format == 'csv' else parse_ecb_series(source)
+
+
+def run(repeat):
+    print(f'{"query":20} {"format":8} {"bytes":>12} {"parse ms":>10} {"obs":>8}')
+    for name in QUERIES:
+        reference = None
+        for wire_format in ECB_WIRE_FORMATS:
+            with open(fixture_path(name, wire_format), 'rb') as f:
+                body = f.read()
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = parse_fixture(body, wire_format)
+                timings.append(time.perf_counter() - start)
+
+            # every format has to give the same observations
+            if reference is None:
+                reference = result
+            else:
+                for expected, actual in zip(reference, result):
+                    assert np.array_equal(expected, actual, equal_nan=expected.dtype.kind == 'f'), (name, wire_format)
+
+            print(f'{name:20} {wire_format:8} {len(body):12,} {min(timings) * 1e3:10.1f} {len(result[2]):8,}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of ECB wire formats')
+    parser.add_argument('--record', action='store_true', help='download fixtures before running the benchmark')
+    parser.add_argument('--stub', action='store_true', help='record fixtures from a local stand-in of the ECB service')
+    parser.add_argument('--entrypoint', default=ECB_ENTRYPOINT)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.entrypoint)
+    elif args.stub or not fixtures_recorded():
+        record_from_stub()
+    run(args.repeat)
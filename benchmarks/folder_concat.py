@@ -0,0 +1,69 @@
+# Compares the former accumulation of folder results, which grew a DataFrame with pd.concat for every file,
+# with collecting the per-file frames and concatenating them once (concat_frames). The frames are those of
+# process_CAMT053_folder for small generated files (see synthetic.py); the time per file of the former way
+# grows with the number of files, with concat_frames it stays flat. The former way takes minutes beyond a few
+# thousand files, it is run only up to --old-limit files:
+#     python benchmarks/folder_concat.py [--files 100 1000 10000] [--old-limit 2000]
+import argparse
+import time
+
+import pandas as pd
+
+from kktools.ISO20022 import Camt053, concat_frames
+from synthetic import camt053_document
+
+
+def accumulate_per_file(frames):
+    # the former way: every file copies all rows collected so far
+    df = pd.DataFrame()
+    for frame in frames:
+        df = pd.concat([df, frame])
+    return df
+
+
+def collect_once(frames):
+    collected = []
+    for frame in frames:
+        collected.append(frame)
+    return concat_frames(collected)
+
+
+def file_frames(n_files, n_entries):
+    frames = []
+    for i in range(n_files):
+        camt = Camt053(camt053_document(1, n_entries, seed=i), columnar=True)
+        frames.append(camt.get_transactions(categorical=False))
+    return frames
+
+
+def run(file_counts, n_entries, old_limit):
+    frames = file_frames(max(file_counts), n_entries)
+
+    print(f'{"files":>7} {"rows":>9} {"per file s":>11} {"per file us/file":>17} {"once s":>8} {"once us/file":>13}')
+    for n_files in file_counts:
+        start = time.perf_counter()
+        new = collect_once(frames[:n_files])
+        new_time = time.perf_counter() - start
+
+        if n_files <= old_limit:
+            start = time.perf_counter()
+            old = accumulate_per_file(frames[:n_files])
+            old_time = time.perf_counter() - start
+
+            # both ways have to give the same rows
+            pd.testing.assert_frame_equal(old, new)
+            old_columns = f'{old_time:11.3f} {old_time / n_files * 1e6:17.1f}'
+        else:
+            old_columns = f'{"-":>11} {"-":>17}'
+
+        print(f'{n_files:7,} {len(new):9,} {old_columns} {new_time:8.3f} {new_time / n_files * 1e6:13.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of accumulating results of a folder of files')
+    parser.add_argument('--files', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--entries', type=int, default=5, help='entries per file')
+    parser.add_argument('--old-limit', type=int, default=2000, help='largest number of files for the former way')
+    args = parser.parse_args()
+
+    run(args.files, args.entries, args.old_limit)
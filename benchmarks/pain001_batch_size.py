@@ -0,0 +1,49 @@
+# Compares reading of the Pain001 batch header with the former descendant xpaths (.//), which scanned all payments
+# of the batch, and with Pain001._process_batch_header, which visits only the children of PmtInf before the first
+# payment, for batches of 10 to 100k payments; the header time should not grow with the size of the batch.
+# Files with one batch are generated (see synthetic.py):
+#     python benchmarks/pain001_batch_size.py [--sizes 10 100 1000 10000 100000]
+import argparse
+import time
+import timeit
+
+from kktools.ISO20022 import Pain001, parse_xml_file
+from synthetic import pain001_document
+
+
+def header_with_xpaths(batch):
+    # the batch header as it was read before the lookups were scoped to the header elements
+    debtor_account = batch.xpath('.//DbtrAcct/Id/IBAN|.//DbtrAcct/Id/Othr/Id')
+    return {'PmtInfId': batch.xpath('.//PmtInfId')[0].text,
+            'debtor_name': batch.xpath('.//Dbtr/Nm')[0].text,
+            'debtor_account': debtor_account[0].text if len(debtor_account) > 0 else '',
+            'execution_date': batch.xpath('.//ReqdExctnDt')[0].text}
+
+
+def run(sizes):
+    print(f'{"payments":>9} {"xpath header us":>16} {"header us":>10} {"full parse us/payment":>22}')
+    for n_payments in sizes:
+        document = pain001_document(1, n_payments)
+        pain = Pain001(pain001_document(1, 1))
+        batch = parse_xml_file(document).xpath('.//PmtInf')[0]
+
+        # both ways have to read the same header
+        assert header_with_xpaths(batch) == pain._process_batch_header(batch), n_payments
+
+        number = max(3, 20000 // n_payments)
+        old = timeit.timeit(lambda: header_with_xpaths(batch), number=number) / number
+        new = timeit.timeit(lambda: pain._process_batch_header(batch), number=number) / number
+
+        start = time.perf_counter()
+        Pain001(document)
+        full = (time.perf_counter() - start) / n_payments
+
+        print(f'{n_payments:9,} {old * 1e6:16.1f} {new * 1e6:10.1f} {full * 1e6:22.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of Pain001 batch header extraction by batch size')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000])
+    args = parser.parse_args()
+
+    run(args.sizes)
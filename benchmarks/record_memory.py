@@ -0,0 +1,58 @@
+# Compares the memory of parsed rows kept as dicts with the __slots__ record types (see core.Record):
+#   container - sys.getsizeof of one row, values (strings, numbers) excluded
+#   retained  - memory held per row after parsing, values included, measured with tracemalloc
+# Files are generated (see synthetic.py):
+#     python benchmarks/record_memory.py [--rows 20000]
+import argparse
+import gc
+import sys
+import tracemalloc
+
+from kktools.ISO20022 import Camt053, Pain001
+from synthetic import camt053_document, pain001_document
+
+
+def parse_camt053(document, records):
+    return Camt053(document, records=records).transactions
+
+
+def parse_pain001(document, records):
+    return Pain001(document, records=records).all_payments
+
+
+def retained(parse, document, records):
+    # memory allocated by parsing which is still held once only the rows are kept
+    gc.collect()
+    tracemalloc.start()
+    try:
+        rows = parse(document, records)
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return rows, size
+
+
+def run(n_rows):
+    cases = [('Camt053 transaction', parse_camt053, camt053_document(10, n_rows // 10)),
+             ('Pain001 payment', parse_pain001, pain001_document(10, n_rows // 10))]
+
+    print(f'{"row":20} {"rows":>7} {"container dict":>15} {"record":>7} {"retained dict":>14} {"record":>7}')
+    for name, parse, document in cases:
+        dicts, dicts_size = retained(parse, document, False)
+        records, records_size = retained(parse, document, True)
+
+        # records have to give the same rows as dicts
+        assert len(dicts) == len(records) and all(record == row for record, row in zip(records, dicts)), name
+
+        n = len(dicts)
+        print(f'{name:20} {n:7,} {sys.getsizeof(dicts[0]):13} B {sys.getsizeof(records[0]):5} B '
+              f'{dicts_size / n:12.0f} B {records_size / n:5.0f} B')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of memory per parsed row, dicts and records')
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    run(args.rows)
@@ -0,0 +1,91 @@
+# Synthetic CAMT053 and PAIN001 documents for the benchmarks, generated from a seed so that runs are repeatable
+# and no real bank data has to be kept in the repository.
+import random
+
+CAMT053_NAMESPACE = 'urn:iso:std:iso:20022:tech:xsd:camt.053.001.02'
+PAIN001_NAMESPACE = 'urn:iso:std:iso:20022:tech:xsd:pain.001.001.03'
+
+
+def camt053_entry(i, rnd):
+    # returns the Ntry element and its signed amount
+    amount = rnd.randint(1, 10 ** 6) / 100
+    indicator = rnd.choice(['CRDT', 'DBIT'])
+    # every third creditor is a party with a nested name, as some banks send it
+    creditor = f'<Pty><Nm>Creditor {i}</Nm></Pty>' if i % 3 == 0 else f'<Nm>Creditor {i}</Nm>'
+    entry = (f'<Ntry><Amt Ccy="EUR">{amount:.2f}</Amt><CdtDbtInd>{indicator}</CdtDbtInd><Sts>BOOK</Sts>'
+             f'<BookgDt><Dt>2023-01-02</Dt></BookgDt><ValDt><Dt>2023-01-03</Dt></ValDt><AcctSvcrRef>REF{i}</AcctSvcrRef>'
+             f'<BkTxCd><Domn><Cd>PMNT</Cd><Fmly><Cd>RCDT</Cd><SubFmlyCd>ESCT</SubFmlyCd></Fmly></Domn>'
+             f'<Prtry><Cd>X{i % 7}</Cd><Issr>BANK</Issr></Prtry></BkTxCd>'
+             f'<NtryDtls><TxDtls><Refs><InstrId>I{i}</InstrId><PmtInfId>P{i}</PmtInfId><EndToEndId>E{i}</EndToEndId></Refs>'
+             f'<RltdPties><Dbtr><Nm>Debtor {i}</Nm></Dbtr><DbtrAcct><Id><IBAN>DE{i:020d}</IBAN></Id></DbtrAcct>'
+             f'<Cdtr>{creditor}</Cdtr><CdtrAcct><Id><Othr><Id>ACC{i}</Id></Othr></Id></CdtrAcct></RltdPties>'
+             f'<RltdAgts><DbtrAgt><FinInstnId><BIC>BANKDEFF</BIC></FinInstnId></DbtrAgt></RltdAgts>'
+             f'<RmtInf><Ustrd>Invoice {i}</Ustrd><Ustrd> part 2</Ustrd></RmtInf><AddtlTxInf>Tx info {i}</AddtlTxInf>'
+             f'</TxDtls></NtryDtls><AddtlNtryInf>Entry info {i}</AddtlNtryInf></Ntry>')
+    return entry, -amount if indicator == 'DBIT' else amount
+
+
+def camt053_statement(s, n_entries, rnd, account_id, opening=1000.0):
+    entries = []
+    total = 0.0
+    for i in range(n_entries):
+        entry, amount = camt053_entry(s * 100000 + i, rnd)
+        entries.append(entry)
+        total += amount
+    closing = round(opening + total, 2)
+
+    # every other statement has an account name, some have an empty one, and every third statement has
+    # an opening balance of the previous day (PRCD) only
+    name = ('', '<Nm>Account name</Nm>', '', '<Nm/>')[s % 4]
+    opening_code = 'OPBD' if s % 3 else 'PRCD'
+    return (f'<Stmt><Id>STMT{s}</Id><CreDtTm>2023-01-02T10:00:00</CreDtTm>'
+            f'<Acct><Id><IBAN>{account_id}</IBAN></Id><Ccy>EUR</Ccy><Ownr><Nm>Owner</Nm></Ownr>{name}</Acct>'
+            + balance(opening_code, opening, '2023-01-02') + balance('CLBD', closing, '2023-01-02')
+            + balance('CLAV', closing, '2023-01-02') + ''.join(entries) + '</Stmt>')
+
+
+def balance(code, amount, date):
+    indicator = 'DBIT' if amount < 0 else 'CRDT'
+    return (f'<Bal><Tp><CdOrPrtry><Cd>{code}</Cd></CdOrPrtry></Tp><Amt Ccy="EUR">{abs(amount):.2f}</Amt>'
+            f'<CdtDbtInd>{indicator}</CdtDbtInd><Dt><Dt>{date}</Dt></Dt></Bal>')
+
+
+def camt053_document(n_statements, n_entries, seed=0, namespaced=True):
+    # returns a CAMT053 file with n_statements statements of n_entries entries each as bytes
+    rnd = random.Random(seed)
+    root = f'<Document xmlns="{CAMT053_NAMESPACE}">' if namespaced else '<Document>'
+    statements = [camt053_statement(s, n_entries, rnd, f'DE89370400440532{seed % 1000:03d}{s:03d}')
+                  for s in range(n_statements)]
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n' + root
+            + '<BkToCstmrStmt><GrpHdr><MsgId>M1</MsgId><CreDtTm>2023-01-02T10:00:00</CreDtTm></GrpHdr>'
+            + ''.join(statements) + '</BkToCstmrStmt></Document>').encode('utf-8')
+
+
+def pain001_payment(k, i, rnd):
+    amount = rnd.randint(1, 10 ** 6) / 100
+    currency = 'EUR' if i % 4 else 'JPY'
+    account = f'<IBAN>FR{k:020d}</IBAN>' if i % 2 else f'<Othr><Id>O{k}</Id></Othr>'
+    instruction = f'<InstrId>I{k}</InstrId>' if i % 3 else ''
+    return (f'<CdtTrfTxInf><PmtId>{instruction}<EndToEndId>E{k}</EndToEndId></PmtId>'
+            f'<Amt><InstdAmt Ccy="{currency}">{amount:.2f}</InstdAmt></Amt>'
+            f'<CdtrAgt><FinInstnId><BIC>CRED{i % 10}XXX</BIC></FinInstnId></CdtrAgt>'
+            f'<Cdtr><Nm>Beneficiary {k}</Nm><PstlAdr><Ctry>FR</Ctry><AdrLine>Street {k}</AdrLine>'
+            f'<AdrLine>Paris</AdrLine></PstlAdr></Cdtr><CdtrAcct><Id>{account}</Id></CdtrAcct>'
+            f'<RmtInf><Ustrd>Inv {k}</Ustrd></RmtInf></CdtTrfTxInf>')
+
+
+def pain001_document(n_batches, n_payments, seed=0):
+    # returns a PAIN001 file with n_batches payment batches (PmtInf) of n_payments payments each as bytes
+    rnd = random.Random(seed)
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n', f'<Document xmlns="{PAIN001_NAMESPACE}"><CstmrCdtTrfInitn>',
+             f'<GrpHdr><MsgId>M1</MsgId><NbOfTxs>{n_batches * n_payments}</NbOfTxs><InitgPty><Nm>Init</Nm></InitgPty>'
+             '</GrpHdr>']
+    for b in range(n_batches):
+        parts.append(f'<PmtInf><PmtInfId>B{b}</PmtInfId><PmtMtd>TRF</PmtMtd><NbOfTxs>{n_payments}</NbOfTxs>'
+                     f'<ReqdExctnDt>2023-01-0{b % 9 + 1}</ReqdExctnDt><Dbtr><Nm>Payer {b}</Nm></Dbtr>'
+                     f'<DbtrAcct><Id><IBAN>DE{b:020d}</IBAN></Id></DbtrAcct>'
+                     '<DbtrAgt><FinInstnId><BIC>DEBTDEFF</BIC></FinInstnId></DbtrAgt>')
+        parts.extend(pain001_payment(b * 1000000 + i, i, rnd) for i in range(n_payments))
+        parts.append('</PmtInf>')
+    parts.append('</CstmrCdtTrfInitn></Document>')
+    return ''.join(parts).encode('utf-8')
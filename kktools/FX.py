@@ -3,27 +3,119 @@ from lxml import etree
 import shutil
 import os
 import datetime
+from functools import partial
+from .core import Record, map_files
 
-def extract_trades_and_save_FIS(source_path, archive_folder, output_path, company_code, BU_DICT, CP_DICT):
-    swaps, forwards = extract_360T_trades(source_path, archive_folder, company_code, BU_DICT, CP_DICT)
-    df_forwards = pd.DataFrame()
-    df_swaps = pd.DataFrame()
-    for forward in forwards:
-        df_forwards = pd.concat([df_forwards, forward.convert_to_FIS()])
-    for swap in swaps:
-        df_swaps = pd.concat([df_swaps, swap.convert_to_FIS()])
+def extract_trades_and_save_FIS(source_path, archive_folder, output_path, company_code, BU_DICT, CP_DICT,
+                                workers=None):
+    # all trades are converted at once per product type; files are archived only after the outputs are written
+    swaps, forwards, parsed_paths = read_360T_trades(source_path, company_code, workers)
+    df_forwards, df_swaps = convert_trades_to_FIS(forwards, swaps, BU_DICT, CP_DICT)
+    save_FIS(df_forwards, df_swaps, output_path)
 
-    current_time = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    archive_files(parsed_paths, archive_folder)
+    return df_forwards, df_swaps
+
+
+def save_FIS(df_forwards, df_swaps, output_path, time_format="%Y%m%d%H%M%S"):
+    # writes converted trades to <time>_forwards.xlsx and <time>_swaps.xlsx files for the FIS upload
+    current_time = datetime.datetime.now().strftime(time_format)
     if len(df_forwards) > 0:
         df_forwards.to_excel(output_path + r'/' + current_time + '_forwards.xlsx',
                              startrow=3, sheet_name='Spot_Fwd', index=False)
     if len(df_swaps) > 0:
         df_swaps.to_excel(output_path + r'/' + current_time + '_swaps.xlsx',
                           startrow=3, sheet_name='Swap', index=False)
-    return df_forwards, df_swaps
+
+
+def format_FIS_dates(dates):
+    # vectorized Trade360T.process_date: 'YYYY-MM-DD...' strings to 'DD/MM/YYYY'
+    dates = pd.Series(dates, dtype=str)
+    return dates.str.slice(8, 10) + '/' + dates.str.slice(5, 7) + '/' + dates.str.slice(0, 4)
+
+def trades_to_dataframe(trades):
+    # TradeColumns, list of Trade360T objects or list of their data dicts to a DataFrame of the raw trade fields
+    if isinstance(trades, TradeColumns):
+        return trades.to_dataframe()
+    data = [trade.data if isinstance(trade, Trade360T) else trade for trade in trades]
+    if len(data) == 0:
+        return pd.DataFrame()
+    return pd.DataFrame({key: [trade[key] for trade in data] for key in data[0]})
+
+def forwards_to_FIS(forwards, BU_DICT, CP_DICT):
+    # converts all fxOutright trades to the FIS upload format at once, every column in one vectorized operation
+    df = trades_to_dataframe(forwards)
+    if len(df) == 0:
+        return pd.DataFrame()
+
+    columns = ['F', df['BU'].map(BU_DICT), df['Counterparty'].map(CP_DICT), 'FXFWEXT',
+               format_FIS_dates(df['trade_date']), format_FIS_dates(df['vd']), df['direction'],
+               df['buy_currency'], df['sell_currency'], df['amount'], df['spot'], df['fwdpnts'], df['rate'],
+               df['reference_id']]
+    return pd.DataFrame(dict(zip(Trade360T.FIS_FWD_COLUMNS, columns)), index=df.index)
+
+def swaps_to_FIS(swaps, BU_DICT, CP_DICT):
+    # converts all fxSwap trades to the FIS upload format at once, every column in one vectorized operation
+    df = trades_to_dataframe(swaps)
+    if len(df) == 0:
+        return pd.DataFrame()
+
+    columns = [df['BU'].map(BU_DICT), df['Counterparty_near_leg'].map(CP_DICT), 'FXSWEXT',
+               format_FIS_dates(df['trade_date']), df['direction_near_leg'], df['buy_currency_near_leg'],
+               df['sell_currency_near_leg'], format_FIS_dates(df['vd_near_leg']), df['amount_near_leg'],
+               df['spot_near_leg'], df['fwdpnts_near_leg'], df['rate_near_leg'],
+               format_FIS_dates(df['vd_far_leg']), df['amount_far_leg'], df['spot_far_leg'],
+               df['fwdpnts_far_leg'], df['rate_far_leg'], df['reference_id']]
+    return pd.DataFrame(dict(zip(Trade360T.FIS_SWP_COLUMNS, columns)), index=df.index)
+
+def convert_trades_to_FIS(forwards, swaps, BU_DICT, CP_DICT):
+    # batch version of Trade360T.convert_to_FIS, returns (df_forwards, df_swaps) with one row per trade
+    return forwards_to_FIS(forwards, BU_DICT, CP_DICT), swaps_to_FIS(swaps, BU_DICT, CP_DICT)
+
+
+FWD_FIELDS = ('spot', 'fwdpnts', 'rate', 'vd', 'Counterparty', 'direction', 'currency',
+              'buy_currency', 'sell_currency', 'amount', 'opposite_amount')
+
+
+class FxOutrightData(Record):
+    __slots__ = ('product_name', 'BU', 'trade_date', 'reference_id') + FWD_FIELDS
+
+
+class FxSwapData(Record):
+    __slots__ = (('product_name', 'BU', 'trade_date', 'reference_id') +
+                 tuple(field + '_near_leg' for field in FWD_FIELDS) +
+                 tuple(field + '_far_leg' for field in FWD_FIELDS))
+
+
+class TradeColumns:
+    # columnar storage of 360T trades of one product type: every field of the record type (FxOutrightData or
+    # FxSwapData) is appended to its own list, file_names keeps the confirmation file of every trade
+    def __init__(self, record_type):
+        self.record_type = record_type
+        self.columns = {key: [] for key in record_type._keys}
+        self.file_names = []
+        self._lists = [(key, self.columns[key]) for key in record_type._keys]
+
+    def append(self, data, file_name=None):
+        for key, col_list in self._lists:
+            col_list.append(data[key])
+        self.file_names.append(file_name)
+
+    def __len__(self):
+        return len(self.file_names)
+
+    def iter_dicts(self):
+        for values in zip(*self.columns.values()):
+            yield dict(zip(self.columns, values))
+
+    def to_dataframe(self):
+        return pd.DataFrame(self.columns)
 
 
 class Trade360T:
+    RECORD_TYPES = {'fxOutright': FxOutrightData,
+                    'fxSwap': FxSwapData}
+
     FIS_FWD_COLUMNS = ['Spot/Forward',
                        'Business Unit',
                        'Counterparty',
@@ -69,36 +161,42 @@ class Trade360T:
 
     def get_tree_from_file(self, file_name):
         try:
-            with open(file_name, 'r') as file:
-                data = file.read()
-                data = bytes(data, 'utf-8')
+            # the file is parsed from its bytes, without decoding to str and encoding back
+            with open(file_name, 'rb') as file:
                 parser = etree.XMLParser(recover=True, encoding='utf-8')
-                tree = etree.fromstring(data, parser)
+                tree = etree.fromstring(file.read(), parser)
                 return tree
         except FileNotFoundError as e:
             print(f"File {file_name} not found!")
             raise
 
     def get_data_from_tree(self):
-        product = self.tree.xpath('.//product')[0].getchildren()[0]
+        # the first product, tradeDate and referenceId elements are found in one pass over the document
+        found = {}
+        for element in self.tree.iter('product', 'tradeDate', 'referenceId'):
+            found.setdefault(element.tag, element)
+            if len(found) == 3:
+                break
+
+        product = found['product'][0]
         product_name = product.tag
         data_dict = {'product_name': product_name}
         data_dict['BU'] = self.company_code
 
-        trade_date = self.tree.xpath('.//tradeDate')[0].text[:10]
+        trade_date = found['tradeDate'].text[:10]
         data_dict['trade_date'] = trade_date
 
-        reference_id = self.tree.xpath('.//referenceId')[0].text[:10]
+        reference_id = found['referenceId'].text[:10]
         data_dict['reference_id'] = reference_id
 
         if product_name == 'fxOutright':
             data_dict = self.process_fwd(product, data_dict, '')
 
         if product_name == 'fxSwap':
-            near_leg = self.tree.xpath('.//product/fxSwap/fxNearLeg')[0]
+            near_leg = product.find('fxNearLeg')
             data_dict = self.process_fwd(near_leg, data_dict, '_near_leg')
 
-            far_leg = self.tree.xpath('.//product/fxSwap/fxFarLeg')[0]
+            far_leg = product.find('fxFarLeg')
             data_dict = self.process_fwd(far_leg, data_dict, '_far_leg')
 
         return data_dict
@@ -106,25 +204,30 @@ class Trade360T:
     def process_fwd(self, product, data_dict_gen, add_on):
         data_dict = {}
 
-        buyer = product.xpath('./buyer')[0].text
-        seller = product.xpath('./seller')[0].text
-        vd = product.xpath('./effectiveDate')[0].text
+        # texts of the child elements are collected in one pass (the first element wins if a tag repeats)
+        fields = {}
+        for child in product:
+            fields.setdefault(child.tag, child.text)
 
-        currency_buyer = product.xpath('./currency1')[0].text
-        currency_seller = product.xpath('./currency2')[0].text
+        buyer = fields['buyer']
+        seller = fields['seller']
+        vd = fields['effectiveDate']
 
-        spot = float(product.xpath('./referenceSpotRate')[0].text)
-        fwdpnts = float(product.xpath('./forwardPoints')[0].text)
-        rate = float(product.xpath('./outrightRate')[0].text)
+        currency_buyer = fields['currency1']
+        currency_seller = fields['currency2']
+
+        spot = float(fields['referenceSpotRate'])
+        fwdpnts = float(fields['forwardPoints'])
+        rate = float(fields['outrightRate'])
 
         data_dict['spot'] = spot
         data_dict['fwdpnts'] = fwdpnts
         data_dict['rate'] = rate
         data_dict['vd'] = vd
 
-        notional_currency = product.xpath('./notionalCurrency')[0].text
-        notional_amount = product.xpath('./notionalAmount')[0].text
-        opposite_amount = product.xpath('./oppositeAmount')[0].text
+        notional_currency = fields['notionalCurrency']
+        notional_amount = fields['notionalAmount']
+        opposite_amount = fields['oppositeAmount']
 
         if buyer == self.company_code:
             data_dict['Counterparty'] = seller
@@ -159,45 +262,19 @@ class Trade360T:
         return {**data_dict_gen, **data_dict}
 
     def convert_to_FIS(self):
-        df_deal = pd.DataFrame.from_dict([self.data])
+        # one-row DataFrame in the FIS upload format, convert_trades_to_FIS converts many trades at once
         if self.type == 'fxOutright':
-            df_deal['FIS_deal_type'] = 'FXFWEXT'
-            cols = ['product_name', 'BU', 'Counterparty', 'FIS_deal_type', 'trade_date', 'vd', 'direction',
-                    'buy_currency',
-                    'sell_currency', 'amount', 'spot', 'fwdpnts', 'rate', 'reference_id']
-
-            df_deal['vd'] = df_deal['vd'].apply(self.process_date)
-            df_deal['trade_date'] = df_deal['trade_date'].apply(self.process_date)
-
-            df_deal['BU'] = df_deal['BU'].map(self.BU_DICT)
-            df_deal['Counterparty'] = df_deal['Counterparty'].map(self.CP_DICT)
-
-            df_deal['product_name'] = 'F'
-
-            df_deal = df_deal[cols]
-            df_deal.columns = self.FIS_FWD_COLUMNS
-
+            return forwards_to_FIS([self.data], self.BU_DICT, self.CP_DICT)
         elif self.type == 'fxSwap':
-            df_deal['FIS_deal_type'] = 'FXSWEXT'
-            cols = ['BU', 'Counterparty_near_leg', 'FIS_deal_type', 'trade_date',
-                    'direction_near_leg', 'buy_currency_near_leg', 'sell_currency_near_leg',
-                    'vd_near_leg', 'amount_near_leg', 'spot_near_leg', 'fwdpnts_near_leg', 'rate_near_leg',
-                    'vd_far_leg', 'amount_far_leg', 'spot_far_leg', 'fwdpnts_far_leg', 'rate_far_leg', 'reference_id']
-
-            df_deal['vd_near_leg'] = df_deal['vd_near_leg'].apply(self.process_date)
-            df_deal['vd_far_leg'] = df_deal['vd_far_leg'].apply(self.process_date)
-            df_deal['trade_date'] = df_deal['trade_date'].apply(self.process_date)
-
-            df_deal['BU'] = df_deal['BU'].map(self.BU_DICT)
-            df_deal['Counterparty_near_leg'] = df_deal['Counterparty_near_leg'].map(self.CP_DICT)
+            return swaps_to_FIS([self.data], self.BU_DICT, self.CP_DICT)
+        return None
 
-            df_deal = df_deal[cols]
-            df_deal.columns = self.FIS_SWP_COLUMNS
-
-        else:
-            df_deal = None
-
-        return df_deal
+    def to_record(self):
+        # returns trade data as a compact FxOutrightData/FxSwapData record, None for other products
+        record_type = self.RECORD_TYPES.get(self.type)
+        if record_type is None:
+            return None
+        return record_type.from_dict(self.data)
 
     @staticmethod
     def process_date(date):
@@ -214,9 +291,68 @@ class Trade360T:
         return 'Trade ID ' + self.id + ': ' + self.type
 
 
-def extract_360T_trades(source_path, archive_folder, company_code, BU_DICT=[], CP_DICT=[]):
+def parse_360T_file(file_path, company_code):
+    # parses a single 360T confirmation to its data dict, which is cheap to send between processes;
+    # returns (data, None) or (None, reason) so that one broken file does not stop the whole batch
+    try:
+        return Trade360T(file_path, company_code, {}, {}).data, None
+    except Exception as e:
+        return None, str(e)
+
+def parse_360T_files(file_paths, company_code, workers=None):
+    # yields results of parse_360T_file in the order of file_paths,
+    # with workers > 1 the files are parsed in parallel in a pool of processes
+    yield from map_files(partial(parse_360T_file, company_code=company_code), file_paths, workers)
+
+def read_360T_trades(source_path, company_code, workers=None):
+    # parses all confirmations in source_path without moving them, returns swaps and forwards as TradeColumns
+    # and the paths of all parsed files, which are to be archived once the trades are stored
+    swaps = TradeColumns(FxSwapData)
+    forwards = TradeColumns(FxOutrightData)
+    parsed_paths = []
+
+    file_names = [file_name for file_name in os.listdir(source_path)
+                  if os.path.isfile(os.path.join(source_path, file_name))]
+    file_paths = [os.path.join(source_path, file_name) for file_name in file_names]
+
+    for file_name, file_path, (data, reason) in zip(file_names, file_paths,
+                                                    parse_360T_files(file_paths, company_code, workers)):
+        if data is None:
+            print(f'\n Could not parse file: {file_name}')
+            continue
+        if data['product_name'] == 'fxOutright':
+            forwards.append(data, file_name)
+        if data['product_name'] == 'fxSwap':
+            swaps.append(data, file_name)
+        parsed_paths.append(file_path)
+
+    return swaps, forwards, parsed_paths
+
+def archive_files(file_paths, archive_folder):
+    # moves files to archive_folder; a file which cannot be moved stays where it is and is processed again later
+    for file_path in file_paths:
+        file_name = os.path.basename(file_path)
+        try:
+            shutil.move(file_path, os.path.join(archive_folder, file_name))
+        except OSError as e:
+            print(f'\n Could not archive file: {file_name}, reason: {e}')
+
+def extract_360T_trades(source_path, archive_folder, company_code, BU_DICT=[], CP_DICT=[], columnar=False,
+                        workers=None):
+    # with columnar=True trades are returned as TradeColumns (swaps, forwards) with the paths of the parsed files
+    # and with workers > 1 files are parsed in parallel processes (Trade360T objects keep their lxml trees, which
+    # cannot be sent between processes). Columnar files are not archived here: the caller moves them with
+    # archive_files(parsed_paths, archive_folder) once the trades are stored, as extract_trades_and_save_FIS does,
+    # so that no file is lost when a later step fails. Otherwise files are moved to archive_folder after all trades
+    # of the batch have been collected
+    if workers is not None and workers > 1 and not columnar:
+        raise ValueError('Parallel parsing of 360T trades requires columnar=True')
+    if columnar:
+        return read_360T_trades(source_path, company_code, workers)
+
     swaps = []
     forwards = []
+    parsed_paths = []
 
     for file_name in os.listdir(source_path):
         # check if current file_path is a file
@@ -229,8 +365,9 @@ def extract_360T_trades(source_path, archive_folder, company_code, BU_DICT=[], C
                 if trade.type == 'fxSwap':
                     swaps.append(trade)
 
-                shutil.move(file_path,
-                            os.path.join(archive_folder, file_name))
+                parsed_paths.append(file_path)
             except:
                 print(f'\n Could not parse file: {file_name}')
-    return swaps, forwards
\ No newline at end of file
+
+    archive_files(parsed_paths, archive_folder)
+    return swaps, forwards
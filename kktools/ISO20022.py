@@ -1,7 +1,16 @@
 from lxml import etree
+from array import array
+from functools import partial
+import numpy as np
 import pandas as pd
+from decimal import Decimal
+import datetime
+import hashlib
+import mmap
+import sqlite3
 import os
 import re
+from .core import Record, records_to_dataframe, to_minor_units, from_minor_units, currency_exponent, map_files
 
 def get_tag_text2(tree_el, addr):
     tags = tree_el.xpath('.//' + addr)
@@ -19,47 +28,392 @@ def get_tag_text(tree_el, addr):
         tag_text = ''
     return tag_text
 
-class Pain001:
-    def __init__(self, file_name):
-
+def get_account_tag(tree_el):
+    # for <Acct>/Id/IBAN and <Acct>/Id/Othr/Id elements returns the tag of the account element
+    # (e.g. DbtrAcct, CdtrAcct), for all other elements returns None
+    parent = tree_el.getparent()
+    if tree_el.tag == 'IBAN':
+        if parent.tag == 'Id':
+            return parent.getparent().tag
+    elif parent.tag == 'Othr':
+        grandparent = parent.getparent()
+        if grandparent.tag == 'Id':
+            return grandparent.getparent().tag
+    return None
+
+def is_tx_details(tree_el, entry):
+    # checks if the element is <Ntry>/NtryDtls/TxDtls of the given entry
+    if tree_el.tag != 'TxDtls':
+        return False
+    parent = tree_el.getparent()
+    return parent.tag == 'NtryDtls' and parent.getparent() is entry
+
+def get_bank_tx_code_path(tree_el, bank_tx_code):
+    # for the code elements of the given BkTxCd element returns their path relative to it
+    # (Domn/Cd, Domn/Fmly/Cd, Domn/Fmly/SubFmlyCd, Prtry/Cd, Prtry/Issr), for all other elements returns None
+    parent = tree_el.getparent()
+    if parent.tag == 'Fmly':
+        domain = parent.getparent()
+        if domain.tag == 'Domn' and domain.getparent() is bank_tx_code:
+            return 'Domn/Fmly/' + tree_el.tag
+    elif parent.getparent() is bank_tx_code and parent.tag in ('Domn', 'Prtry'):
+        return parent.tag + '/' + tree_el.tag
+    return None
+
+# tags of all elements of a CAMT entry which are needed to extract its fields
+ENTRY_TAGS = frozenset(['Amt', 'CdtDbtInd', 'Dt', 'AcctSvcrRef', 'BkTxCd', 'Cd', 'SubFmlyCd', 'Issr',
+                        'Nm', 'IBAN', 'Id', 'Ustrd', 'AddtlNtryInf', 'AddtlTxInf',
+                        'InstrId', 'PmtInfId', 'EndToEndId'])
+
+# fields of a CAMT053 transaction in the order they are returned by Camt053._get_entry_values
+ENTRY_COLUMNS = ('Amount', 'Currency', 'Dr_Cr', 'Debtor', 'DebtorAccount', 'Creditor', 'CreditorAccount',
+                 'Reference', 'AddInfo', 'AddtlTxInf', 'Domn_Cd', 'Fmly_Cd', 'SubFmly_Cd', 'Prtry_Cd', 'Prtry_Issr',
+                 'ValDt', 'BookgDt', 'InstrId', 'PmtInfId', 'EndToEndId', 'AcctSvcrRef')
+
+# fields of the statement added to each CAMT053 transaction
+STATEMENT_HEADER_COLUMNS = ('Statement_id', 'Account_id', 'Account_owner')
+
+# fields of a balance in the long balances table of Camt053, Statement is the position of the statement in
+# statements_info; in statements_info and wide DataFrames each balance becomes Amount_<Code>, Currency_<Code>, ...
+BALANCE_COLUMNS = ('Statement', 'Code', 'Amount', 'Currency', 'Description', 'CdtDbtInd', 'Date')
+BALANCE_FIELDS = ('Amount', 'Currency', 'Code', 'Description', 'CdtDbtInd', 'Date')
+
+def compile_paths(paths):
+    # compiles (path, field) pairs, e.g. ('Cdtr/PstlAdr/Ctry', 'Country'), into a single xpath expression
+    # relative to the context element and a map from the last tag of each path to its field;
+    # the last tags have to be unique, so that each found element can be assigned to its field by its tag
+    fields = {}
+    for path, field in paths:
+        tag = path.rsplit('/', 1)[-1]
+        if fields.get(tag, field) != field:
+            raise ValueError(f'Tag {tag} is used for fields {fields[tag]} and {field}')
+        fields[tag] = field
+    xpath = etree.XPath('|'.join('./' + path for path, field in paths))
+    return xpath, fields
+
+def find_paths(tree_el, compiled):
+    # returns {field: [elements]} for the elements matching compiled paths, elements are in document order
+    xpath, fields = compiled
+    found = {}
+    for el in xpath(tree_el):
+        field = fields[el.tag]
+        if field in found:
+            found[field].append(el)
+        else:
+            found[field] = [el]
+    return found
+
+# paths of the PAIN001 batch header fields relative to PmtInf children preceding the payments
+ACCOUNT_ID_PATHS = compile_paths([('Id/IBAN', 'account'), ('Id/Othr/Id', 'account')])
+PARTY_NAME_PATHS = compile_paths([('Nm', 'name')])
+
+# paths of the PAIN001 payment fields relative to CdtTrfTxInf
+PAYMENT_PATHS = compile_paths([('PmtId/InstrId', 'InstrId'),
+                               ('PmtId/EndToEndId', 'EndToEndId'),
+                               ('Amt/InstdAmt', 'InstdAmt'),
+                               ('CdtrAgt/FinInstnId/BIC', 'BIC'),
+                               ('CdtrAgt/FinInstnId/BICFI', 'BIC'),
+                               ('Cdtr/Nm', 'Name'),
+                               ('Cdtr/PstlAdr/Ctry', 'Country'),
+                               ('Cdtr/PstlAdr/AdrLine', 'Address'),
+                               ('CdtrAcct/Id/IBAN', 'Creditor_account'),
+                               ('CdtrAcct/Id/Othr/Id', 'Creditor_account'),
+                               ('RmtInf/Ustrd', 'Reference')])
+
+def parse_amount(amount, currency, minor_units=False):
+    # amounts are floats by default, with minor_units=True exact integers in minor units of the currency (ISO 4217)
+    if minor_units:
+        return to_minor_units(amount, currency)
+    return float(amount)
+
+def first_text(found, field):
+    # text of the first element found for the field or empty string
+    elements = found.get(field)
+    if elements is None:
+        return ''
+    return elements[0].text
+
+def joined_text(found, field):
+    # texts of all elements found for the field, each followed by a space
+    text = ''
+    for el in found.get(field, ()):
+        if el.text is not None:
+            text += el.text
+            text += ' '
+    return text
+
+def is_namespaced(tree_el):
+    return isinstance(tree_el.tag, str) and tree_el.tag[0] == '{'
+
+def strip_namespaces(tree_el):
+    # removes namespaces from the tags of the element and all its descendants,
+    # so that the same xpath expressions work for any version of the ISO20022 schema
+    for el in tree_el.iter():
+        tag = el.tag
+        if isinstance(tag, str) and tag[0] == '{':
+            el.tag = tag.split('}', 1)[1]
+
+# start tag of the root element with the namespace declarations,
+# e.g. <Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02">
+DOCUMENT_TAG = re.compile(rb'<Document(?:\s[^>]*)?>')
+
+def read_chunks(source, chunk_size=1 << 20):
+    # yields the content of a path, bytes-like object or binary file-like object in chunks;
+    # paths are read chunk by chunk like file objects, so only one chunk of the file is held at a time
+    if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+        with memoryview(source) as view:
+            for start in range(0, len(view), chunk_size):
+                yield bytes(view[start:start + chunk_size])
+    elif hasattr(source, 'read'):
+        yield from iter(lambda: source.read(chunk_size), b'')
+    else:
         try:
-            with open(file_name, 'r', encoding='utf-8-sig') as file:
-                data = file.read()
+            file = open(source, 'rb')
         except FileNotFoundError:
-            print(f"File {file_name} not found!")
+            print(f"File {source} not found!")
             raise
 
-        data = re.sub('<Document[\S\s]*?>', '<Document>', data)
-        data = bytes(data, 'utf-8')
-        parser = etree.XMLParser(recover=True, encoding='utf-8')
-        self._tree = etree.fromstring(data, parser)
+        with file:
+            yield from read_chunks(file, chunk_size)
+
+def iter_xml_chunks(source, chunk_size=1 << 20):
+    # yields the content of the source (see read_chunks) in binary chunks; namespace declarations are removed
+    # from the <Document> tag at the beginning of the document, so the document is never decoded to str
+    chunks = read_chunks(source, chunk_size)
+    head = b''
+    match = None
+    for chunk in chunks:
+        head += chunk
+        match = DOCUMENT_TAG.search(head)
+        if match is not None or len(head) >= 4 * chunk_size:
+            break
+
+    if match is not None:
+        head = head[:match.start()] + b'<Document>' + head[match.end():]
+    yield head
+    yield from chunks
+
+def describe_source(source):
+    # name of the source used in messages: the path, the name of the file object or '<bytes>'
+    if isinstance(source, (str, os.PathLike)):
+        return source
+    if hasattr(source, 'read'):
+        return getattr(source, 'name', '<file object>')
+    return '<bytes>'
+
+def parse_xml_file(source):
+    # the source (path, bytes-like or binary file-like object) is fed to lxml in binary chunks,
+    # without full copies of the document as str or bytes
+    parser = etree.XMLParser(recover=True, huge_tree=True)
+    for chunk in iter_xml_chunks(source):
+        parser.feed(chunk)
+    tree = parser.close()
+
+    # documents using prefixed namespaces (e.g. <ns2:Document>) are accessed by local names as well
+    if is_namespaced(tree):
+        strip_namespaces(tree)
+    return tree
+
+def iterparse_groups(source, group_tag, item_tag, rewind=False):
+    # walks through the source (see read_chunks) with a pull parser and yields ('item', element) as soon as each
+    # item element (e.g. Ntry, CdtTrfTxInf) is closed and ('group', element) at the end of each group element
+    # containing them (e.g. Stmt, PmtInf); items are children of their group, which is element.getparent().
+    # Namespaces are stripped from the group before its first item is yielded (its header precedes the items,
+    # so it is complete by then) and from each later item. Processed elements are cleared as soon as the consumer
+    # asks for the next one, so memory usage does not depend on the size of the file.
+    # With rewind=True a file object is read again from its beginning
+    if rewind and hasattr(source, 'read'):
+        if not (hasattr(source, 'seekable') and source.seekable()):
+            raise ValueError('Streaming mode requires a seekable file object to read the file again')
+        source.seek(0)
+
+    parser = etree.XMLPullParser(events=('start', 'end'), tag=('{*}' + group_tag, '{*}' + item_tag),
+                                 recover=True, huge_tree=True)
+    group = None
+    namespaced = False
+    first_item = True
+
+    for chunk in iter_xml_chunks(source):
+        parser.feed(chunk)
+
+        for event, element in parser.read_events():
+            tag = etree.QName(element).localname
+
+            if event == 'start':
+                if tag == group_tag:
+                    group = element
+                    namespaced = is_namespaced(element)
+                    first_item = True
+                continue
+
+            if tag == item_tag:
+                if namespaced:
+                    strip_namespaces(group if first_item else element)
+                first_item = False
+                yield 'item', element
+
+                element.clear()
+                while element.getprevious() is not None:
+                    del group[0]
+
+            elif tag == group_tag:
+                if namespaced and first_item:
+                    strip_namespaces(element)
+                yield 'group', element
+
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+                group = None
+
+    parser.close()
+
+class Pain001Payment(Record):
+    __slots__ = ('Name', 'Amount', 'Currency', 'Reference', 'Creditor_account', 'Country', 'Address', 'BIC',
+                 'EndToEndId', 'InstrId', 'PmtInfId', 'debtor_name', 'debtor_account', 'execution_date')
+
+
+class Pain001:
+    def __init__(self, file_name, records=False, streaming=False, minor_units=False):
+
+        # with records=True payments are Pain001Payment records instead of dicts,
+        # with minor_units=True amounts are exact integers in minor units of their currency and control sums are Decimal
+        self.records = records
+        self.minor_units = minor_units
+        self.streaming = streaming
+        self.file_name = describe_source(file_name)
+        self._source = file_name
+        self._passes = 0
+
+        # number of payments and their control sum for every batch, next to the values declared in the file;
+        # in streaming mode the totals of the current batch are updated while its payments are produced
+        self.batch_totals = []
+        self._batch_headers = []
+        self._all_payments = None
+
+        if streaming:
+            # the file is parsed incrementally, payments are not kept in memory
+            # and are produced again by iter_payments() / iter_batches() when needed
+            for event, data, batch_header in self._iterparse():
+                pass
+        else:
+            self._tree = parse_xml_file(file_name)
 
-        # list of all elements with batches
-        batches = self._tree.xpath('.//PmtInf')
-        self.batches_count = len(batches)
+            # list of all elements with batches
+            batches = self._tree.xpath('.//PmtInf')
 
-        self.all_payments = []
-        for batch in batches:
-            payments = self._get_payments_per_batch(batch)
-            self.all_payments.extend(payments)
+            self._all_payments = []
+            for batch in batches:
+                payments = self._get_payments_per_batch(batch)
+                self._all_payments.extend(payments)
 
-        self.total_payments_count = len(self.all_payments)
+        self.batches_count = len(self.batch_totals)
+        self.total_payments_count = sum(totals['count'] for totals in self.batch_totals)
 
-    def _process_batch_header(self, batch):
-        execution_date = batch.xpath('.//ReqdExctnDt')[0].text
-        debtor_name = batch.xpath('.//Dbtr/Nm')[0].text
+    @property
+    def all_payments(self):
+        if self._all_payments is None:
+            self._all_payments = list(self.iter_payments())
+        return self._all_payments
 
-        debtor_account = batch.xpath('.//DbtrAcct/Id/IBAN|.//DbtrAcct/Id/Othr/Id')
-        if len(debtor_account) > 0:
-            debtor_account = debtor_account[0].text
+    def iter_payments(self):
+        if self._all_payments is not None:
+            yield from self._all_payments
         else:
-            debtor_account = ''
-
-        PmtInfId = batch.xpath('.//PmtInfId')
-        if len(PmtInfId) > 0:
-            PmtInfId = PmtInfId[0].text
+            for event, payment, batch_header in self._iterparse():
+                if event == 'payment':
+                    yield payment
+
+    def iter_batches(self):
+        # yields (batch_header, payments) for every batch, only payments of one batch are held at a time
+        if self._all_payments is not None:
+            start = 0
+            for batch_header, totals in zip(self._batch_headers, self.batch_totals):
+                yield batch_header, self._all_payments[start:start + totals['count']]
+                start += totals['count']
         else:
-            PmtInfId = ''
+            payments = []
+            for event, data, batch_header in self._iterparse():
+                if event == 'payment':
+                    payments.append(data)
+                else:
+                    yield batch_header, payments
+                    payments = []
+
+    def _iterparse(self):
+        # yields ('payment', payment, batch_header) as soon as each CdtTrfTxInf is closed
+        # and ('batch', totals, batch_header) at the end of each PmtInf (see iterparse_groups)
+        rewind = self._passes > 0
+        self._passes += 1
+        self.batch_totals = []
+        self._batch_headers = []
+
+        batch_header = None
+        totals = None
+
+        for event, element in iterparse_groups(self._source, 'PmtInf', 'CdtTrfTxInf', rewind):
+            if event == 'item':
+                if batch_header is None:
+                    batch = element.getparent()
+                    batch_header = self._process_batch_header(batch)
+                    totals = self._new_batch_totals(batch, batch_header)
+
+                payment = self._get_payment(element, batch_header)
+                self._add_to_totals(totals, payment)
+                yield 'payment', payment, batch_header
+            else:
+                if batch_header is None:
+                    batch_header = self._process_batch_header(element)
+                    totals = self._new_batch_totals(element, batch_header)
+
+                yield 'batch', totals, batch_header
+                batch_header = None
+
+    def _new_batch_totals(self, batch, batch_header):
+        declared_count = batch.findtext('NbOfTxs')
+        declared_sum = batch.findtext('CtrlSum')
+        totals = {'PmtInfId': batch_header['PmtInfId'],
+                  'NbOfTxs': int(declared_count) if declared_count else None,
+                  'CtrlSum': self._parse_control_sum(declared_sum) if declared_sum else None,
+                  'count': 0,
+                  'control_sum': 0}
+        self.batch_totals.append(totals)
+        self._batch_headers.append(batch_header)
+        return totals
+
+    def _parse_control_sum(self, control_sum):
+        # control sums add up amounts of any currencies, so in minor_units mode they are kept as exact decimals
+        if self.minor_units:
+            return Decimal(control_sum)
+        return float(control_sum)
+
+    def _add_to_totals(self, totals, payment):
+        totals['count'] += 1
+        if self.minor_units:
+            totals['control_sum'] += from_minor_units(payment['Amount'], payment['Currency'])
+        else:
+            totals['control_sum'] += payment['Amount']
+
+    def _process_batch_header(self, batch):
+        # header elements precede the payments, so only the children of PmtInf before the first payment
+        # are visited and extraction does not depend on the size of the batch
+        PmtInfId = ''
+        execution_date = None
+        debtor_name = None
+        debtor_account = ''
+
+        for child in batch:
+            tag = child.tag
+            if tag == 'CdtTrfTxInf':
+                break
+            if tag == 'PmtInfId':
+                PmtInfId = child.text
+            elif tag == 'ReqdExctnDt':
+                execution_date = child.text
+            elif tag == 'Dbtr':
+                debtor_name = find_paths(child, PARTY_NAME_PATHS)['name'][0].text
+            elif tag == 'DbtrAcct':
+                debtor_account = first_text(find_paths(child, ACCOUNT_ID_PATHS), 'account')
 
         batch_header = {
                         'PmtInfId': PmtInfId,
@@ -74,82 +428,58 @@ class Pain001:
 
         # processing information related to the whole batch
         batch_header = self._process_batch_header(batch)
+        totals = self._new_batch_totals(batch, batch_header)
 
         # processing information for all individual payments in the batch
-        payments = batch.xpath('.//CdtTrfTxInf')
+        payments = batch.iter('CdtTrfTxInf')
         payments_list = []
 
         for payment in payments:
-            amount = payment.xpath('.//InstdAmt')[0].text
-
-            currency = payment.xpath('.//InstdAmt/@Ccy')[0]
-
-            name = payment.xpath('.//Cdtr/Nm')[0].text
-
-            creditor_account = payment.xpath('.//CdtrAcct/Id/IBAN|.//CdtrAcct/Id/Othr/Id')
-
-            if len(creditor_account) > 0:
-                creditor_account = creditor_account[0].text
-            else:
-                creditor_account = ''
-
-            country = payment.xpath('.//Ctry')
-
-            if len(country) > 0:
-                country = country[0].text
-            else:
-                country = ''
-
-            references = payment.xpath('.//RmtInf/Ustrd')
-            reference = ''
-            for ref in references:
-                reference += ref.text
-                reference += ' '
-
-            addresses = payment.xpath('.//AdrLine')
-            address = ''
-            for addr in addresses:
-                address += addr.text
-                address += ' '
-
-            InstrId = payment.xpath('.//InstrId')
-            if len(InstrId) > 0:
-                InstrId = InstrId[0].text
-            else:
-                InstrId = ''
-
-            end_to_end = payment.xpath('.//EndToEndId')
-            if len(end_to_end) > 0:
-                end_to_end = end_to_end[0].text
-            else:
-                end_to_end = ''
-
-            BIC = payment.xpath('.//BIC')
-            if len(BIC) > 0:
-                BIC = BIC[0].text
-            else:
-                BIC = ''
-
-            payment_dict = {
-                'Name': name,
-                'Amount': float(amount),
-                'Currency': currency,
-                'Reference': reference,
-                'Creditor_account': creditor_account,
-                'Country': country,
-                'Address': address,
-                'BIC': BIC,
-                'EndToEndId': end_to_end,
-                'InstrId': InstrId
-            }
-
-            # adding to each individual batch header batch information (about payer and execution date)
-            payment_dict.update(batch_header)
-
-            payments_list.append(payment_dict)
+            payment = self._get_payment(payment, batch_header)
+            self._add_to_totals(totals, payment)
+            payments_list.append(payment)
 
         return payments_list
 
+    def _get_payment(self, payment, batch_header):
+        # all fields are found with one precompiled xpath scoped to the payment, e.g. country and address
+        # are taken from the creditor's postal address only and BIC from the creditor agent only
+        found = find_paths(payment, PAYMENT_PATHS)
+
+        amount = found['InstdAmt'][0]
+        currency = amount.attrib['Ccy']
+        amount = parse_amount(amount.text, currency, self.minor_units)
+        name = found['Name'][0].text
+        creditor_account = first_text(found, 'Creditor_account')
+        country = first_text(found, 'Country')
+        address = joined_text(found, 'Address')
+        reference = joined_text(found, 'Reference')
+        BIC = first_text(found, 'BIC')
+        InstrId = first_text(found, 'InstrId')
+        end_to_end = first_text(found, 'EndToEndId')
+
+        if self.records:
+            return Pain001Payment(name, amount, currency, reference, creditor_account,
+                                  country, address, BIC, end_to_end, InstrId, *batch_header.values())
+
+        payment_dict = {
+            'Name': name,
+            'Amount': amount,
+            'Currency': currency,
+            'Reference': reference,
+            'Creditor_account': creditor_account,
+            'Country': country,
+            'Address': address,
+            'BIC': BIC,
+            'EndToEndId': end_to_end,
+            'InstrId': InstrId
+        }
+
+        # adding to each individual batch header batch information (about payer and execution date)
+        payment_dict.update(batch_header)
+
+        return payment_dict
+
     def __str__(self):
         file_info = f'Number of batches: {self.batches_count} \n'
         file_info += f'Total number of payments: {self.total_payments_count}'
@@ -161,8 +491,130 @@ class InvalidCamt53Exception(Exception):
     pass
 
 
+class Camt053Transaction(Record):
+    __slots__ = ENTRY_COLUMNS + STATEMENT_HEADER_COLUMNS
+
+
+class TransactionColumns:
+    # columnar (struct-of-arrays) storage of CAMT053 transactions: every entry field is appended to its own list,
+    # the statement header is stored once per statement and entries refer to it by the statement position
+    def __init__(self, minor_units=False):
+        self.minor_units = minor_units
+        self.columns = {col: [] for col in ENTRY_COLUMNS}
+        self.statements = []
+        self.statement_codes = array('l')
+        self._lists = [self.columns[col] for col in ENTRY_COLUMNS]
+        self._last_header = None
+
+    def append(self, values, stmt_header_main):
+        # all entries of a statement share the same header dict, so a new statement starts when the header changes
+        if stmt_header_main is not self._last_header:
+            self.statements.append(stmt_header_main)
+            self._last_header = stmt_header_main
+
+        for col_list, value in zip(self._lists, values):
+            col_list.append(value)
+        self.statement_codes.append(len(self.statements) - 1)
+
+    def __len__(self):
+        return len(self.statement_codes)
+
+    def iter_dicts(self):
+        for code, values in zip(self.statement_codes, zip(*self._lists)):
+            entry_dict = dict(zip(ENTRY_COLUMNS, values))
+            entry_dict.update(self.statements[code])
+            yield entry_dict
+
+    def iter_records(self):
+        headers = [tuple(stmt[col] for col in STATEMENT_HEADER_COLUMNS) for stmt in self.statements]
+        for code, values in zip(self.statement_codes, zip(*self._lists)):
+            yield Camt053Transaction(*values, *headers[code])
+
+    def _header_codes(self, col):
+        # returns unique values of the statement header field and their codes for every entry
+        stmt_codes, categories = pd.factorize(np.array([stmt[col] for stmt in self.statements], dtype=object))
+        entry_codes = stmt_codes[np.asarray(self.statement_codes, dtype=np.intp)]
+        return entry_codes, categories
+
+    def to_dataframe(self, categorical=True):
+        data = dict(self.columns)
+        # float amounts give a float64 column, amounts in minor units an int64 column
+        data['Amount'] = np.asarray(data['Amount'], dtype=np.int64 if self.minor_units else np.float64)
+        for col in STATEMENT_HEADER_COLUMNS:
+            entry_codes, categories = self._header_codes(col)
+            if categorical:
+                data[col] = pd.Categorical.from_codes(entry_codes, categories=categories)
+            else:
+                # missing header fields (e.g. an empty <Nm/>) have the code -1 and stay None
+                values = np.full(len(entry_codes), None, dtype=object)
+                present = entry_codes >= 0
+                values[present] = categories[entry_codes[present]]
+                data[col] = values
+        return pd.DataFrame(data)
+
+    def to_arrow(self):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError('pyarrow is required to export transactions as an arrow table')
+
+        data = {col: pa.array(values) for col, values in self.columns.items()}
+        for col in STATEMENT_HEADER_COLUMNS:
+            entry_codes, categories = self._header_codes(col)
+            data[col] = pa.DictionaryArray.from_arrays(pa.array(entry_codes, mask=entry_codes < 0),
+                                                       pa.array(categories, type=pa.string()))
+        return pa.table(data)
+
+
+def pivot_balances(balances, n_statements, include=None, exclude=(), minor_units=False):
+    # turns the long balances table ({column: list} for BALANCE_COLUMNS) into {<Field>_<Code>: array with one value
+    # per statement}, columns are ordered by the first appearance of each code and then by BALANCE_FIELDS; only the
+    # columns in include (all if None) and not in exclude are created, statements without the balance get NaN
+    # (or <NA> in nullable Int64 amounts when amounts are in minor units)
+    if len(balances['Code']) == 0:
+        return {}
+
+    code_positions, codes = pd.factorize(np.array(balances['Code'], dtype=object))
+    statements = np.array(balances['Statement'])
+
+    # the last balance wins when a code is repeated within a statement, same as in statements_info
+    keys = statements * len(codes) + code_positions
+    last = len(keys) - 1 - np.unique(keys[::-1], return_index=True)[1]
+
+    values = {}
+    columns = {}
+    for position, code in enumerate(codes):
+        rows = last[code_positions[last] == position]
+        for field in BALANCE_FIELDS:
+            name = field + '_' + code
+            if (include is not None and name not in include) or name in exclude:
+                continue
+            if field == 'Amount' and minor_units:
+                if field not in values:
+                    values[field] = np.array(balances[field], dtype=np.int64)
+                column = np.zeros(n_statements, dtype=np.int64)
+                missing = np.ones(n_statements, dtype=bool)
+                column[statements[rows]] = values[field][rows]
+                missing[statements[rows]] = False
+                columns[name] = pd.arrays.IntegerArray(column, missing)
+                continue
+            if field == 'Amount':
+                column = np.full(n_statements, np.nan)
+            else:
+                column = np.full(n_statements, np.nan, dtype=object)
+            if field == 'Code':
+                column[statements[rows]] = code
+            else:
+                if field not in values:
+                    values[field] = np.array(balances[field], dtype=column.dtype)
+                column[statements[rows]] = values[field][rows]
+            columns[name] = column
+
+    return columns
+
+
 class Camt053:
-    def __init__(self, file_name):
+    def __init__(self, file_name, streaming=False, columnar=False, records=False, minor_units=False):
 
         self.DEFINITIONS = {'OPBD': 'Opening Booked balance',
                             'OPAV': 'Opening available balance',
@@ -170,64 +622,231 @@ class Camt053:
                             'CLAV': 'Closing Available balance',
                             'PRCD': 'Previously Closed Booked balance',
                             'FWAV': 'Forward Available balance'}
-        self.file_name = file_name
+        # file_name can also be a bytes-like or binary file-like object
+        self.file_name = describe_source(file_name)
+        self.streaming = streaming
+        self._source = file_name
+        self._passes = 0
+
+        # in columnar mode transactions are kept in TransactionColumns instead of a list of dicts,
+        # with records=True transactions are produced as Camt053Transaction records instead of dicts
+        # with minor_units=True amounts of transactions and balances are exact integers in minor units of their
+        # currency (e.g. cents), so totals are exact and balances can be compared without tolerance
+        self.minor_units = minor_units
+        self.columns = TransactionColumns(minor_units) if columnar else None
+        self.records = records
+        self._transactions = None
+
+        # balances of all statements as a long table {column: list} of BALANCE_COLUMNS,
+        # pivoted to the wide form only when requested
+        self.balances = {col: [] for col in BALANCE_COLUMNS}
+
+        if streaming:
+            # the file is parsed incrementally, transactions are not kept in memory (unless columnar mode is used)
+            # and are produced again by iter_transactions() when needed
+            self.statements_info = []
+            for event, data, context in self._iterparse():
+                if event == 'stmt':
+                    # for statements context holds their balances, for entries the statement header
+                    self._add_balances(len(self.statements_info), context)
+                    self.statements_info.append(data)
+                elif columnar:
+                    self.columns.append(data, context)
+
+            if len(self.statements_info) == 0:
+                raise InvalidCamt53Exception('Zero number of statements present in the file')
+        else:
+            try:
+                tree = parse_xml_file(file_name)
+            except FileNotFoundError:
+                raise
+            except:
+                raise InvalidCamt53Exception('Could not parse as xml file')
 
-        try:
-            with open(file_name, 'r') as file:
-                data = file.read()
-        except FileNotFoundError:
-            print(f"File {file_name} not found!")
-            raise
+            stmt_list = tree.xpath('.//Stmt')
+
+            if len(stmt_list) == 0:
+                raise InvalidCamt53Exception('Zero number of statements present in the file')
+
+            self.statements_info = self._process_stmts(stmt_list)
+
+        self.accounts_list = [{'Account_id': stmt['Account_id'],
+                               'Account_owner': stmt['Account_owner']} for stmt in self.statements_info]
+
+    @property
+    def transactions(self):
+        if self._transactions is None:
+            self._transactions = list(self.iter_transactions())
+        return self._transactions
+
+    def iter_transactions(self):
+        if self._transactions is not None:
+            yield from self._transactions
+        elif self.columns is not None:
+            if self.records:
+                yield from self.columns.iter_records()
+            else:
+                yield from self.columns.iter_dicts()
+        else:
+            for event, values, stmt_header_main in self._iterparse():
+                if event == 'entry':
+                    yield self._make_transaction(values, stmt_header_main)
+
+    def get_transactions(self, engine='pandas', categorical=True):
+        # returns all transactions as a pandas DataFrame (engine='pandas') or a pyarrow Table (engine='pyarrow');
+        # in columnar mode the result is built directly from the columns without creating a dict per transaction,
+        # statement header columns are categorical unless categorical=False is passed
+        columns = self.columns
+        if columns is None:
+            columns = TransactionColumns(self.minor_units)
+            for event, values, stmt_header_main in self._iter_entry_values():
+                columns.append(values, stmt_header_main)
+
+        if engine == 'pandas':
+            return columns.to_dataframe(categorical)
+        elif engine == 'pyarrow':
+            return columns.to_arrow()
+        else:
+            raise ValueError(f'Unknown engine: {engine}')
+
+    def _iter_entry_values(self):
+        if self._transactions is not None:
+            # entries of a statement follow each other and share one header dict, as they do when parsed,
+            # so that TransactionColumns keeps one header per statement and not one per entry
+            stmt_header_main = None
+            header_values = None
+            for entry_dict in self._transactions:
+                values = tuple(entry_dict[col] for col in STATEMENT_HEADER_COLUMNS)
+                if values != header_values:
+                    header_values = values
+                    stmt_header_main = dict(zip(STATEMENT_HEADER_COLUMNS, values))
+                yield 'entry', tuple(entry_dict[col] for col in ENTRY_COLUMNS), stmt_header_main
+        else:
+            for event, values, stmt_header_main in self._iterparse():
+                if event == 'entry':
+                    yield event, values, stmt_header_main
+
+    def _iterparse(self):
+        # yields ('entry', entry_values, stmt_header_main) as soon as each Ntry is closed
+        # and ('stmt', stmt_info, balances) at the end of each Stmt (see iterparse_groups);
+        # file objects are read again from the beginning when transactions are requested in streaming mode
+        rewind = self._passes > 0
+        self._passes += 1
+
+        stmt_info = None
+        stmt_header_main = None
+        tx_num = 0
+        total_amount = 0
 
-        data = re.sub('<Document[\S\s]*?>', '<Document>', data)
-        data = bytes(data, 'utf-8')
         try:
-            parser = etree.XMLParser(recover=True, encoding='utf-8')
-            tree = etree.fromstring(data, parser)
-        except:
-            raise InvalidCamt53Exception('Could not parse as xml file')
+            for event, element in iterparse_groups(self._source, 'Stmt', 'Ntry', rewind):
+                if event == 'item':
+                    if stmt_info is None:
+                        stmt = element.getparent()
+                        stmt_info, balances = self._process_stmt_header(stmt)
+                        stmt_header_main = self._stmt_header_main(stmt)
+
+                    values = self._get_entry_values(element)
+                    tx_num += 1
+                    total_amount += values[0]
+                    yield 'entry', values, stmt_header_main
+                else:
+                    if stmt_info is None:
+                        stmt_info, balances = self._process_stmt_header(element)
 
-        stmt_list = tree.xpath('.//Stmt')
+                    stmt_info.update({'transaction_count': tx_num, 'total_amount': total_amount})
+                    yield 'stmt', stmt_info, balances
 
-        if len(stmt_list) == 0:
-            raise InvalidCamt53Exception('Zero number of statements present in the file')
+                    stmt_info = None
+                    tx_num = 0
+                    total_amount = 0
+        except etree.XMLSyntaxError:
+            raise InvalidCamt53Exception('Could not parse as xml file')
 
-        self.statements_info = self._get_stmts_info(stmt_list)
+    def get_statements(self, exclude=()):
+        # returns the same DataFrame as pd.DataFrame(self.statements_info) built from the long balances table,
+        # columns listed in exclude are never created
+        n_statements = len(self.statements_info)
+        header = {col: [stmt[col] for stmt in self.statements_info] for col in STATEMENT_HEADER_COLUMNS}
+        summary = {col: [stmt[col] for stmt in self.statements_info] for col in ('transaction_count', 'total_amount')}
+        balances = pivot_balances(self.balances, n_statements, exclude=exclude, minor_units=self.minor_units)
 
-        self.accounts_list = [{'Account_id': stmt['Account_id'],
-                               'Account_owner': stmt['Account_owner']} for stmt in self.statements_info]
+        # balances of the first statement precede the summary columns, balances with codes which appear only
+        # in later statements follow them, as the columns of a DataFrame created from the list of dicts do
+        first_codes = set(self.balances['Code'][:self.balances['Statement'].count(0)])
+        columns = {col: header[col] for col in header if col not in exclude}
+        columns.update({col: values for col, values in balances.items() if col.split('_', 1)[1] in first_codes})
+        columns.update({col: summary[col] for col in summary if col not in exclude})
+        columns.update(balances)
 
-        self.transactions = self._get_transactions(stmt_list)
+        return pd.DataFrame(columns)
 
     def get_balances(self):
-        df_balances = pd.DataFrame(self.statements_info)
+        n_statements = len(self.statements_info)
+        balances = pivot_balances(self.balances, n_statements,
+                                  include={'Amount_OPBD', 'Amount_PRCD', 'Amount_CLBD', 'Currency_CLBD', 'Date_CLBD'},
+                                  minor_units=self.minor_units)
 
-        if len(df_balances) > 0:
-            if 'Amount_PRCD' in df_balances.columns:
-                if 'Amount_OPBD' in df_balances.columns:
-                    df_balances['Amount_OPBD'].fillna(df_balances['Amount_PRCD'], inplace=True)
-                else:
-                    df_balances['Amount_OPBD'] = df_balances['Amount_PRCD']
-            try:
-                df_balances['Date_CLBD'] = pd.to_datetime(df_balances['Date_CLBD'], format='%Y-%m-%d')
-                cols = ['Statement_id', 'Account_id', 'Currency_CLBD', 'Amount_OPBD', 'Amount_CLBD', 'Date_CLBD',
-                        'transaction_count', 'total_amount']
-                df_balances = df_balances[cols]
-                cols = ['Statement_id', 'Account_id', 'Currency', 'Opening_Balance', 'Closing_Balance', 'Date',
-                        'transaction_count', 'total_amount']
-                df_balances.columns = cols
-            except:
-                print("Error")
-                pass
+        # opening booked balance falls back to the closing booked balance of the previous day (PRCD)
+        opening = balances.get('Amount_OPBD', balances.get('Amount_PRCD'))
+        if 'Amount_OPBD' in balances and 'Amount_PRCD' in balances:
+            opening = pd.Series(opening).fillna(pd.Series(balances['Amount_PRCD'])).array
+
+        try:
+            df_balances = pd.DataFrame({'Statement_id': [stmt['Statement_id'] for stmt in self.statements_info],
+                                        'Account_id': [stmt['Account_id'] for stmt in self.statements_info],
+                                        'Currency': balances['Currency_CLBD'],
+                                        'Opening_Balance': opening,
+                                        'Closing_Balance': balances['Amount_CLBD'],
+                                        'Date': pd.to_datetime(balances['Date_CLBD'], format='%Y-%m-%d'),
+                                        'transaction_count': [stmt['transaction_count'] for stmt in self.statements_info],
+                                        'total_amount': [stmt['total_amount'] for stmt in self.statements_info]})
+        except:
+            print("Error")
+            df_balances = self.get_statements()
+            if opening is not None:
+                df_balances['Amount_OPBD'] = opening
+
+        return df_balances
+
+    def check_balances(self):
+        # adds to get_balances() the difference between the closing balance and the opening balance plus net amount
+        # of the entries of each statement; with minor_units=True the check is an exact integer comparison,
+        # otherwise differences below half of the minor unit of the currency are treated as rounding
+        df_balances = self.get_balances()
+        difference = df_balances['Closing_Balance'] - df_balances['Opening_Balance'] - df_balances['total_amount']
+
+        if self.minor_units:
+            balanced = difference == 0
+        else:
+            tolerance = 0.5 * 10.0 ** -df_balances['Currency'].map(currency_exponent).astype(float)
+            balanced = difference.abs() < tolerance
 
+        df_balances['Difference'] = difference
+        df_balances['Balanced'] = balanced
         return df_balances
 
 
     def _process_stmt_header(self, stmt):
+        # returns the statement info with balances as Amount_<Code>, Currency_<Code>, ... keys
+        # and the same balances as rows of the long balances table
         stmt_header = self._stmt_header_main(stmt)
-        bals_all = self._get_balances_per_stmt(stmt)
-        stmt_header.update(bals_all)
-        return stmt_header
+        balances = self._get_balances_per_stmt(stmt)
+        for Code, amount, Currency, Description, CdtDbtInd, Date in balances:
+            stmt_header.update({'Amount_' + Code: amount,
+                                'Currency_' + Code: Currency,
+                                'Code_' + Code: Code,
+                                'Description_' + Code: Description,
+                                'CdtDbtInd_' + Code: CdtDbtInd,
+                                'Date_' + Code: Date})
+        return stmt_header, balances
+
+    def _add_balances(self, stmt_index, balances):
+        columns = self.balances
+        for balance in balances:
+            columns['Statement'].append(stmt_index)
+            for col, value in zip(BALANCE_COLUMNS[1:], balance):
+                columns[col].append(value)
 
     def _stmt_header_main(self, stmt):
         account_id = stmt.xpath('./Acct/Id/IBAN|./Acct/Id/Othr/Id')[0].text
@@ -244,28 +863,46 @@ class Camt053:
                             'Account_owner': name}
         return stmt_header_main
 
-    def _get_stmts_info(self, stmt_list):
+    def _process_stmts(self, stmt_list):
+        # entries of each statement are extracted only once, the statement summary
+        # (number of transactions and total amount) is calculated from the same result
         statements_info = []
+        if self.columns is None:
+            self._transactions = []
+
         for stmt in stmt_list:
-            stmt_info = self._process_stmt_header(stmt)
-            stmt_summary = self._get_summary_per_stmt(stmt)
+            stmt_info, balances = self._process_stmt_header(stmt)
+            self._add_balances(len(statements_info), balances)
+            stmt_header_main = self._stmt_header_main(stmt)
+            entries_values = self._get_transactions_per_stmt(stmt)
+            stmt_summary = self._get_summary_per_stmt(entries_values)
             stmt_info.update(stmt_summary)
             statements_info.append(stmt_info)
 
+            if self.columns is not None:
+                for values in entries_values:
+                    self.columns.append(values, stmt_header_main)
+            else:
+                self._transactions += [self._make_transaction(values, stmt_header_main) for values in entries_values]
+
         return statements_info
 
-    def _get_summary_per_stmt(self, stmt):
-        transactions = self._get_transactions_per_stmt(stmt)
-        tx_num = len(transactions)
+    def _get_summary_per_stmt(self, entries_values):
+        tx_num = len(entries_values)
 
-        total_amount = sum([t['Amount'] for t in transactions])
+        if self.minor_units:
+            amounts = np.fromiter((values[0] for values in entries_values), dtype=np.int64, count=tx_num)
+            total_amount = int(amounts.sum())
+        else:
+            total_amount = sum([values[0] for values in entries_values])
 
         summary_dict = {'transaction_count': tx_num, 'total_amount': total_amount}
         return summary_dict
 
     def _get_balances_per_stmt(self, stmt):
+        # returns balances of the statement as (Code, Amount, Currency, Description, CdtDbtInd, Date) tuples
         bals = stmt.xpath('.//Bal')
-        bals_all = {}
+        balances = []
 
         for bal in bals:
             Code = bal.xpath('.//Cd')[0].text
@@ -274,231 +911,239 @@ class Camt053:
             except:
                 Description = 'Unknown code'
 
-            amount = bal.xpath('.//Amt')[0].text
-            amount = float(amount)
-
             CdtDbtInd = bal.xpath('.//CdtDbtInd')[0].text
 
             Currency = bal.xpath('.//Amt/@Ccy')[0]
 
+            amount = bal.xpath('.//Amt')[0].text
+            amount = parse_amount(amount, Currency, self.minor_units)
+
             Date = bal.xpath('./Dt/Dt|./Dt/DtTm')[0].text
 
             if CdtDbtInd == 'DBIT':
                 amount = -amount
 
-            bal_dict = {'Amount_' + Code: amount,
-                        'Currency_' + Code: Currency,
-                        'Code_' + Code: Code,
-                        'Description_' + Code: Description,
-                        'CdtDbtInd_' + Code: CdtDbtInd,
-                        'Date_' + Code: Date}
-
-            bals_all.update(bal_dict)
-
-        return bals_all
+            balances.append((Code, amount, Currency, Description, CdtDbtInd, Date))
 
-    def _get_transactions(self, stmt_list):
-        all_entries_list = []
-        for stmt in stmt_list:
-            all_entries_list += self._get_transactions_per_stmt(stmt)
-        return all_entries_list
+        return balances
 
     def _get_transactions_per_stmt(self, stmt):
+        # returns values of all entries of the statement, in the order of ENTRY_COLUMNS
         entries = stmt.xpath('./Ntry')
 
-        stmt_header_main = self._stmt_header_main(stmt)
-
         entries_list = []
 
         for entry in entries:
+            entries_list.append(self._get_entry_values(entry))
 
-            BkTxCd = entry.xpath('.//BkTxCd')
-
-            if len(BkTxCd) > 0:
-                Domn_Cd = get_tag_text(BkTxCd, 'Domn/Cd')
-                Fmly_Cd = get_tag_text(BkTxCd, 'Domn/Fmly/Cd')
-                SubFmly_Cd = get_tag_text(BkTxCd, 'Domn/Fmly/SubFmlyCd')
-                Prtry_Cd = get_tag_text(BkTxCd, 'Prtry/Cd')
-                Prtry_Issr = get_tag_text(BkTxCd, 'Prtry/Issr')
-            else:
-                Domn_Cd = ""
-                Fmly_Cd = ""
-                SubFmly_Cd = ""
-                Prtry_Cd = ""
-                Prtry_Issr = ""
-
-            nm = entry.xpath('.//Dbtr/Nm')
-            if len(nm) > 0:
-                Debtor = nm[0].text
-            else:
-                nm = entry.xpath('.//Dbtr/Pty/Nm')
-                if len(nm) > 0:
-                    Debtor = nm[0].text
-                else:
-                    Debtor = ''
-
-            acct = entry.xpath('.//DbtrAcct/Id/IBAN|.//DbtrAcct/Id/Othr/Id')
-            if len(acct) > 0:
-                DebtorAccount = acct[0].text
-            else:
-                DebtorAccount = ''
+        return entries_list
 
-            nm = entry.xpath('.//Cdtr/Nm')
-            if len(nm) > 0:
-                Creditor = nm[0].text
-            else:
-                nm = entry.xpath('.//Cdtr/Pty/Nm')
-                if len(nm) > 0:
-                    Creditor = nm[0].text
+    def _make_transaction(self, values, stmt_header_main):
+        if self.records:
+            return Camt053Transaction(*values, *stmt_header_main.values())
+
+        entry_dict = dict(zip(ENTRY_COLUMNS, values))
+        entry_dict.update(stmt_header_main)
+        return entry_dict
+
+    def _get_entry_values(self, entry):
+        # all fields are collected in a single walk over the subtree of the entry
+        BkTxCd = None
+        codes = {}
+        names = {}
+        accounts = {}
+        refs = {}
+        Reference = ''
+        AddInfo = ''
+        Amt = None
+        CdtDbtInd = None
+        ValDt = ''
+        BookgDt = ''
+        AcctSvcrRef = ''
+
+        for el in entry.iter():
+            tag = el.tag
+            if tag not in ENTRY_TAGS:
+                continue
+
+            if tag == 'Ustrd':
+                if el.text is not None:
+                    Reference += el.text
+            elif tag == 'Nm':
+                party = el.getparent()
+                if party.tag == 'Pty':
+                    names.setdefault(party.getparent().tag + '/Pty', el.text)
                 else:
-                    Creditor = ''
-
-            acct = entry.xpath('.//CdtrAcct/Id/IBAN|.//CdtrAcct/Id/Othr/Id')
-            if len(acct) > 0:
-                CreditorAccount = acct[0].text
-            else:
-                CreditorAccount = ''
-
-            Reference = ''
-            refs = entry.xpath('.//Ustrd')
-            if len(refs) > 0:
-                for ref in refs:
-                    if ref.text is not None:
-                        Reference += ref.text
-
-            AddInfo = ''
-            refs = entry.xpath('.//AddtlNtryInf')
-            if len(refs) > 0:
-                for ref in refs:
-                    if ref.text is not None:
-                        AddInfo += ref.text
-
-            Amount = entry.xpath('./Amt')[0].text
-            Amount = float(Amount)
-            Currency = entry.xpath('./Amt/@Ccy')[0]
-            CdtDbtInd = entry.xpath('./CdtDbtInd')[0].text
-
-            if CdtDbtInd == 'DBIT':
-                Amount = -Amount
-            try:
-                ValDt = entry.xpath('./ValDt/Dt')[0].text
-            except:
-                ValDt = ''
-
-            try:
-                BookgDt = entry.xpath('./BookgDt/Dt')[0].text
-            except:
-                BookgDt = ''
+                    names.setdefault(party.tag, el.text)
+            elif tag == 'IBAN' or tag == 'Id':
+                acct_tag = get_account_tag(el)
+                if acct_tag is not None:
+                    accounts.setdefault(acct_tag, el.text)
+            elif tag == 'Cd' or tag == 'SubFmlyCd' or tag == 'Issr':
+                if BkTxCd is not None:
+                    code_path = get_bank_tx_code_path(el, BkTxCd)
+                    if code_path is not None:
+                        codes.setdefault(code_path, el.text)
+            elif tag == 'Dt':
+                parent = el.getparent()
+                if parent.getparent() is entry:
+                    if parent.tag == 'ValDt':
+                        ValDt = el.text
+                    elif parent.tag == 'BookgDt':
+                        BookgDt = el.text
+            elif tag == 'AddtlNtryInf':
+                if el.text is not None:
+                    AddInfo += el.text
+            elif tag == 'BkTxCd':
+                if BkTxCd is None:
+                    BkTxCd = el
+            elif tag == 'AddtlTxInf':
+                if is_tx_details(el.getparent(), entry):
+                    refs.setdefault(tag, el.text)
+            elif tag == 'Amt' or tag == 'CdtDbtInd' or tag == 'AcctSvcrRef':
+                if el.getparent() is entry:
+                    if tag == 'Amt':
+                        if Amt is None:
+                            Amt = el
+                    elif tag == 'CdtDbtInd':
+                        if CdtDbtInd is None:
+                            CdtDbtInd = el.text
+                    else:
+                        AcctSvcrRef = el.text
+            elif tag not in refs:
+                # InstrId, PmtInfId, EndToEndId
+                parent = el.getparent()
+                if parent.tag == 'Refs' and is_tx_details(parent.getparent(), entry):
+                    refs[tag] = el.text
+
+        if BkTxCd is not None:
+            Domn_Cd = codes.get('Domn/Cd', '')
+            Fmly_Cd = codes.get('Domn/Fmly/Cd', '')
+            SubFmly_Cd = codes.get('Domn/Fmly/SubFmlyCd', '')
+            Prtry_Cd = codes.get('Prtry/Cd', '')
+            Prtry_Issr = codes.get('Prtry/Issr', '')
+        else:
+            Domn_Cd = ""
+            Fmly_Cd = ""
+            SubFmly_Cd = ""
+            Prtry_Cd = ""
+            Prtry_Issr = ""
+
+        if 'Dbtr' in names:
+            Debtor = names['Dbtr']
+        else:
+            Debtor = names.get('Dbtr/Pty', '')
 
-            try:
-                InstrId = entry.xpath('./NtryDtls/TxDtls/Refs/InstrId')[0].text
-            except:
-                InstrId = ''
+        if 'Cdtr' in names:
+            Creditor = names['Cdtr']
+        else:
+            Creditor = names.get('Cdtr/Pty', '')
 
-            try:
-                PmtInfId = entry.xpath('./NtryDtls/TxDtls/Refs/PmtInfId')[0].text
-            except:
-                PmtInfId = ''
+        DebtorAccount = accounts.get('DbtrAcct', '')
+        CreditorAccount = accounts.get('CdtrAcct', '')
 
-            try:
-                EndToEndId = entry.xpath('./NtryDtls/TxDtls/Refs/EndToEndId')[0].text
-            except:
-                EndToEndId = ''
+        InstrId = refs.get('InstrId', '')
+        PmtInfId = refs.get('PmtInfId', '')
+        EndToEndId = refs.get('EndToEndId', '')
+        AddtlTxInf = refs.get('AddtlTxInf', '')
 
-            try:
-                AddtlTxInf = entry.xpath('./NtryDtls/TxDtls/AddtlTxInf')[0].text
-            except:
-                AddtlTxInf = ''
+        Currency = Amt.attrib['Ccy']
+        Amount = parse_amount(Amt.text, Currency, self.minor_units)
 
-            try:
-                AcctSvcrRef = entry.xpath('./AcctSvcrRef')[0].text
-            except:
-                AcctSvcrRef = ''
-
-            entry_dict = {
-                'Amount': Amount,
-                'Currency': Currency,
-                'Dr_Cr': CdtDbtInd,
-                'Debtor': Debtor,
-                'DebtorAccount': DebtorAccount,
-                'Creditor': Creditor,
-                'CreditorAccount': CreditorAccount,
-                'Reference': Reference,
-                'AddInfo': AddInfo,
-                'AddtlTxInf': AddtlTxInf,
-                'Domn_Cd': Domn_Cd,
-                'Fmly_Cd': Fmly_Cd,
-                'SubFmly_Cd': SubFmly_Cd,
-                'Prtry_Cd': Prtry_Cd,
-                'Prtry_Issr': Prtry_Issr,
-                'ValDt': ValDt,
-                'BookgDt': BookgDt,
-                'InstrId': InstrId,
-                'PmtInfId': PmtInfId,
-                'EndToEndId': EndToEndId,
-                'AcctSvcrRef': AcctSvcrRef
-            }
-            entry_dict.update(stmt_header_main)
-
-            entries_list.append(entry_dict)
+        if CdtDbtInd == 'DBIT':
+            Amount = -Amount
 
-        return entries_list
+        return (Amount, Currency, CdtDbtInd, Debtor, DebtorAccount, Creditor, CreditorAccount,
+                Reference, AddInfo, AddtlTxInf, Domn_Cd, Fmly_Cd, SubFmly_Cd, Prtry_Cd, Prtry_Issr,
+                ValDt, BookgDt, InstrId, PmtInfId, EndToEndId, AcctSvcrRef)
 
     def __str__(self):
         file_info = f'File name: {self.file_name} \n'
         file_info += f'Accounts: {self.accounts_list} \n'
         file_info += f'Number of statements in the file: {len(self.statements_info)} \n'
-        file_info += f'Total number of transactions: {len(self.transactions)}'
+        file_info += f'Total number of transactions: {sum(s["transaction_count"] for s in self.statements_info)}'
         return str(file_info)
 
-def process_CAMT053_folder(folder_CAMT53):
+def parse_camt053_file(full_path, minor_units=False):
+    # parses a single CAMT053 file keeping transactions in columnar form, which is compact to send between processes;
+    # returns (camt, None) or (None, reason) so that one broken file does not stop processing of the whole folder
+    try:
+        return Camt053(full_path, columnar=True, minor_units=minor_units), None
+    except Exception as e:
+        return None, str(e)
+
+def parse_camt053_files(full_paths, workers=None, minor_units=False):
+    # yields results of parse_camt053_file in the order of full_paths,
+    # with workers > 1 the files are parsed in parallel in a pool of processes
+    yield from map_files(partial(parse_camt053_file, minor_units=minor_units), full_paths, workers)
+
+def concat_frames(frames):
+    # concatenates collected chunks once instead of growing a DataFrame with pd.concat inside a loop,
+    # which copies all rows accumulated so far on every iteration
+    if len(frames) == 0:
+        return pd.DataFrame()
+    return pd.concat(frames)
+
+# balance columns of statements which are not returned by process_CAMT053_folder
+STATEMENT_COLUMNS_TO_DROP = frozenset(['Currency_OPBD', 'Code_OPBD',
+                                       'Description_OPBD', 'CdtDbtInd_OPBD', 'Date_OPBD',
+                                       'Currency_CLBD', 'Code_CLBD', 'Description_CLBD', 'CdtDbtInd_CLBD',
+                                       'Date_CLBD', 'Currency_OPAV', 'Code_OPAV',
+                                       'Description_OPAV', 'CdtDbtInd_OPAV', 'Date_OPAV',
+                                       'Currency_FWAV', 'Code_FWAV', 'Description_FWAV', 'CdtDbtInd_FWAV',
+                                       'Date_FWAV', 'Currency_CLAV', 'Code_CLAV',
+                                       'Description_CLAV', 'CdtDbtInd_CLAV', 'Date_CLAV'])
+
+def process_CAMT053_folder(folder_CAMT53, workers=None):
     df_files = []
-    df_statements = pd.DataFrame()
-    df_transactions = pd.DataFrame()
+    df_statements = []
+    df_transactions = []
 
-    for file_path in os.listdir(folder_CAMT53):
-        full_path = os.path.join(folder_CAMT53, file_path)
-        if os.path.isfile(full_path):
-            try:
-                camt = Camt053(full_path)
+    file_paths = [file_path for file_path in os.listdir(folder_CAMT53)
+                  if os.path.isfile(os.path.join(folder_CAMT53, file_path))]
+    full_paths = [os.path.join(folder_CAMT53, file_path) for file_path in file_paths]
 
-                df_stmts_temp = pd.DataFrame(camt.statements_info)
-                df_statements = pd.concat([df_statements, df_stmts_temp])
+    for file_path, (camt, reason) in zip(file_paths, parse_camt053_files(full_paths, workers)):
+        try:
+            if camt is None:
+                raise InvalidCamt53Exception(reason)
 
-                df_trans_temp = pd.DataFrame(camt.transactions)
-                df_transactions = pd.concat([df_transactions, df_trans_temp])
+            df_statements.append(camt.get_statements(exclude=STATEMENT_COLUMNS_TO_DROP))
+            df_transactions.append(camt.get_transactions(categorical=False))
 
-                file_dict = {'file': file_path,
-                             'account_id': camt.accounts_list,
-                             'status': 'CAMT053 parsing successful'}
+            file_dict = {'file': file_path,
+                         'account_id': camt.accounts_list,
+                         'status': 'CAMT053 parsing successful'}
 
-                df_files.append(file_dict)
+            df_files.append(file_dict)
 
-            except Exception as e:
-                file_dict = {'file': file_path,
-                             'account_id': '',
-                             'status': f'CAMT053 parsing not successful, reason: {e}'}
+        except Exception as e:
+            file_dict = {'file': file_path,
+                         'account_id': '',
+                         'status': f'CAMT053 parsing not successful, reason: {e}'}
 
-                df_files.append(file_dict)
+            df_files.append(file_dict)
 
     df_files = pd.DataFrame(df_files)
-    cols_to_drop = ['Currency_OPBD', 'Code_OPBD',
-                    'Description_OPBD', 'CdtDbtInd_OPBD', 'Date_OPBD',
-                    'Currency_CLBD', 'Code_CLBD', 'Description_CLBD', 'CdtDbtInd_CLBD',
-                    'Date_CLBD', 'Currency_OPAV', 'Code_OPAV',
-                    'Description_OPAV', 'CdtDbtInd_OPAV', 'Date_OPAV',
-                    'Currency_FWAV', 'Code_FWAV', 'Description_FWAV', 'CdtDbtInd_FWAV',
-                    'Date_FWAV', 'Currency_CLAV', 'Code_CLAV',
-                    'Description_CLAV', 'CdtDbtInd_CLAV', 'Date_CLAV']
-
-    df_statements = df_statements.drop(axis='columns', labels=cols_to_drop, errors='ignore')
+    df_statements = concat_frames(df_statements)
+    df_transactions = concat_frames(df_transactions)
 
     return df_files, df_statements, df_transactions
 
 
+class Camt052Entry(Record):
+    __slots__ = ('Owner', 'Account', 'Amount', 'Currency', 'Dr_Cr', 'Debtor', 'DebtorAccount',
+                 'Creditor', 'CreditorAccount', 'Reference', 'ValDt', 'BookgDt')
+    _keys = ('Owner', 'Account', 'Amount', 'Currency', 'Dr/Cr', 'Debtor', 'DebtorAccount',
+             'Creditor', 'CreditorAccount', 'Reference', 'ValDt', 'BookgDt')
+
+
 class Camt052:
 
-    def __init__(self, file_name):
+    def __init__(self, file_name, minor_units=False):
+
+        # with minor_units=True amounts are exact integers in minor units of their currency
+        self.minor_units = minor_units
 
         self.DEFINITIONS = {'OPBD': 'Opening Booked balance',
                             'OPAV': 'Opening Available balance',
@@ -507,87 +1152,73 @@ class Camt052:
                             'PRCD': 'Previously Closed Booked balance',
                             'FWAV': 'Forward Available balance'}
 
-        try:
-            with open(file_name, 'r') as file:
-                data = file.read()
-
-        except FileNotFoundError as e:
-            print(f"File {file_name} not found!")
-            raise
-
-        data = re.sub('<Document[\S\s]*?>', '<Document>', data)
-        data = bytes(data, 'utf-8')
-        parser = etree.XMLParser(recover=True, encoding='utf-8')
-        self.tree = etree.fromstring(data, parser)
+        self.tree = parse_xml_file(file_name)
         self.report = self.tree.xpath('.//Rpt')[0]
         self.account_id = self.report.xpath('./Acct/Id/IBAN|./Acct/Id/Othr/Id')[0].text
         self.owner = self.tree.xpath('.//MsgRcpt/Nm')[0].text
 
     def get_transactions(self):
-        entries = self.tree.xpath('.//Ntry')
+        return records_to_dataframe(self.get_entries())
+
+    def get_entries(self):
+        # returns all entries of the report as a list of Camt052Entry records
+        entries = self.tree.iter('Ntry')
         entries_list = []
 
         for entry in entries:
-            Debtor = get_tag_text2(entry, 'Dbtr/Nm')
-            acct = entry.xpath('.//DbtrAcct/Id/IBAN|.//DbtrAcct/Id/Othr/Id')
-
-            if len(acct) > 0:
-                DebtorAccount = acct[0].text
-            else:
-                DebtorAccount = ''
-
-            Creditor = get_tag_text2(entry, 'Cdtr/Nm')
-            acct = entry.xpath('.//CdtrAcct/Id/IBAN|.//CdtrAcct/Id/Othr/Id')
-
-            if len(acct) > 0:
-                CreditorAccount = acct[0].text
-            else:
-                CreditorAccount = ''
-
+            # all fields of the entry are collected in a single walk over its subtree
+            names = {}
+            accounts = {}
             Reference = ''
-            refs = entry.xpath('.//Ustrd')
-
-            if len(refs) > 0:
-                for ref in refs:
-                    Reference += ref.text
-
-            Amount = entry.xpath('./Amt')[0].text
-            Amount = float(Amount)
-            Currency = entry.xpath('./Amt/@Ccy')[0]
-            CdtDbtInd = entry.xpath('./CdtDbtInd')[0].text
+            Amt = None
+            CdtDbtInd = None
+            ValDt = ''
+            BookgDt = ''
+
+            for el in entry.iter():
+                tag = el.tag
+                if tag not in ENTRY_TAGS:
+                    continue
+
+                if tag == 'Ustrd':
+                    if el.text is not None:
+                        Reference += el.text
+                elif tag == 'Nm':
+                    names.setdefault(el.getparent().tag, el.text)
+                elif tag == 'IBAN' or tag == 'Id':
+                    acct_tag = get_account_tag(el)
+                    if acct_tag is not None:
+                        accounts.setdefault(acct_tag, el.text)
+                elif tag == 'Dt':
+                    parent = el.getparent()
+                    if parent.getparent() is entry:
+                        if parent.tag == 'ValDt':
+                            ValDt = el.text
+                        elif parent.tag == 'BookgDt':
+                            BookgDt = el.text
+                elif tag == 'Amt':
+                    if Amt is None and el.getparent() is entry:
+                        Amt = el
+                elif tag == 'CdtDbtInd':
+                    if CdtDbtInd is None and el.getparent() is entry:
+                        CdtDbtInd = el.text
+
+            Debtor = names.get('Dbtr', '')
+            DebtorAccount = accounts.get('DbtrAcct', '')
+            Creditor = names.get('Cdtr', '')
+            CreditorAccount = accounts.get('CdtrAcct', '')
+
+            Currency = Amt.attrib['Ccy']
+            Amount = parse_amount(Amt.text, Currency, self.minor_units)
 
             if CdtDbtInd == 'DBIT':
                 Amount = -Amount
 
-            try:
-                ValDt = entry.xpath('./ValDt/Dt')[0].text
-            except:
-                ValDt = ''
+            entries_list.append(Camt052Entry(self.owner, self.account_id, Amount, Currency, CdtDbtInd,
+                                             Debtor, DebtorAccount, Creditor, CreditorAccount,
+                                             Reference, ValDt, BookgDt))
 
-            try:
-                BookgDt = entry.xpath('./BookgDt/Dt')[0].text
-            except:
-                BookgDt = ''
-
-            entry_dict = {
-                'Owner': self.owner,
-                'Account': self.account_id,
-                'Amount': Amount,
-                'Currency': Currency,
-                'Dr/Cr': CdtDbtInd,
-                'Debtor': Debtor,
-                'DebtorAccount': DebtorAccount,
-                'Creditor': Creditor,
-                'CreditorAccount': CreditorAccount,
-                'Reference': Reference,
-                'ValDt': ValDt,
-                'BookgDt': BookgDt
-
-            }
-
-            entries_list.append(entry_dict)
-
-        return pd.DataFrame.from_dict(entries_list)
+        return entries_list
 
     def get_balances(self):
         bals = self.tree.xpath('.//Bal')
@@ -600,10 +1231,10 @@ class Camt052:
             except:
                 Description = 'Unknown code'
 
-            amount = bal.xpath('.//Amt')[0].text
-            amount = float(amount)
             CdtDbtInd = bal.xpath('.//CdtDbtInd')[0].text
             Currency = bal.xpath('.//Amt/@Ccy')[0]
+            amount = bal.xpath('.//Amt')[0].text
+            amount = parse_amount(amount, Currency, self.minor_units)
             Date = bal.xpath('./Dt/Dt|./Dt/DtTm')[0].text
 
             if CdtDbtInd == 'DBIT':
@@ -628,71 +1259,274 @@ class Camt052:
         return str(self.get_stats())
 
 
-def process_folder2(folder, initial_set=set()):
+def file_sha256(file_name, chunk_size=1 << 20):
+    sha256 = hashlib.sha256()
+    with open(file_name, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class ProcessedFilesManifest:
+    # local SQLite database of the files already processed by process_folder2 and of the statement ids already seen,
+    # files are identified by path, size, modification time and hash of the content
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # the manifest may be used from another thread than the one which opened it (e.g. by a folder watcher),
+        # but from one thread at a time
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,
+                                              sha256 TEXT, status TEXT, processed_at TEXT);
+            CREATE TABLE IF NOT EXISTS statements (statement_id TEXT PRIMARY KEY, file_path TEXT);
+            """)
+
+    def is_unchanged(self, full_path):
+        # a file is unchanged if its size and modification time are the same as recorded,
+        # if only the modification time differs the content hash decides
+        path = os.path.abspath(full_path)
+        row = self._conn.execute('SELECT size, mtime_ns, sha256 FROM files WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return False
+
+        size, mtime_ns, sha256 = row
+        stat = os.stat(path)
+        if stat.st_size != size:
+            return False
+        if stat.st_mtime_ns == mtime_ns:
+            return True
+
+        if file_sha256(path) == sha256:
+            self._conn.execute('UPDATE files SET mtime_ns = ? WHERE path = ?', (stat.st_mtime_ns, path))
+            return True
+        return False
+
+    def statement_ids(self):
+        return {row[0] for row in self._conn.execute('SELECT statement_id FROM statements')}
+
+    def record_file(self, full_path, status, statement_ids=()):
+        path = os.path.abspath(full_path)
+        stat = os.stat(path)
+        processed_at = datetime.datetime.now().isoformat(timespec='seconds')
+        self._conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)',
+                           (path, stat.st_size, stat.st_mtime_ns, file_sha256(path), status, processed_at))
+        self._conn.executemany('INSERT OR IGNORE INTO statements VALUES (?, ?)',
+                               [(statement_id, path) for statement_id in statement_ids])
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        self.close()
+
+
+def collect_camt053_results(parsed, initial_set=set(), manifest=None, skipped_paths=()):
+    # builds the outputs of process_folder2 from parsed files, parsed is an iterable of
+    # (file_name, full_path, (camt, reason)) with results of parse_camt053_file in the order of processing;
+    # statements whose ids are in initial_set are duplicates, returns the five DataFrames of process_folder2
+    # and initial_set extended with the statement ids of the parsed files
     df_files = []
     df_duplicates = []
-    df_statements = pd.DataFrame()
-    df_balances = pd.DataFrame()
-    df_transactions = pd.DataFrame()
+    df_statements = []
+    df_balances = []
+    df_transactions = []
+
+    for file_path, full_path, (camt, reason) in parsed:
+        try:
+            if camt is None:
+                raise InvalidCamt53Exception(reason)
 
-    for file_path in os.listdir(folder):
-        full_path = os.path.join(folder, file_path)
-        if os.path.isfile(full_path):
-            if file_path.endswith('.xml'):
-                try:
-                    camt = Camt053(full_path)
+            df_stmts_temp = camt.get_statements()
+            df_stmts_temp['file_name'] = file_path
 
-                    df_stmts_temp = pd.DataFrame(camt.statements_info)
-                    df_stmts_temp['file_name'] = file_path
+            df_trans_temp = camt.get_transactions(categorical=False)
 
-                    df_trans_temp = pd.DataFrame(camt.transactions)
+            df_balances_temp = camt.get_balances()
 
-                    df_balances_temp = camt.get_balances()
+            new_set = set(df_stmts_temp['Statement_id'])
+            intersection_set = new_set & initial_set
+            new_set_to_use = new_set - initial_set
 
-                    new_set = set(df_stmts_temp['Statement_id'])
-                    intersection_set = new_set & initial_set
-                    new_set_to_use = new_set - initial_set
+            initial_set = initial_set | new_set
 
-                    initial_set = initial_set | new_set
+            file_dict = {'file': file_path,
+                         'account_id': camt.accounts_list,
+                         'status': 'CAMT053 parsing successful'}
 
-                    file_dict = {'file': file_path,
-                                 'account_id': camt.accounts_list,
-                                 'status': 'CAMT053 parsing successful'}
+            if len(intersection_set) > 0:
+                df_duplicates.append({'file_name:': file_path, 'new_stmts': new_set_to_use})
+                file_dict = {'file': file_path,
+                             'account_id': camt.accounts_list,
+                             'status': 'CAMT053 parsing successful, but it is duplicate'}
 
-                    if len(intersection_set) > 0:
-                        df_duplicates.append({'file_name:': file_path, 'new_stmts': new_set_to_use})
-                        file_dict = {'file': file_path,
-                                     'account_id': camt.accounts_list,
-                                     'status': 'CAMT053 parsing successful, but it is duplicate'}
+            filter = df_stmts_temp['Statement_id'].isin(new_set_to_use)
+            df_stmts_temp = df_stmts_temp[filter]
 
-                    filter = df_stmts_temp['Statement_id'].isin(new_set_to_use)
-                    df_stmts_temp = df_stmts_temp[filter]
+            filter = df_balances_temp['Statement_id'].isin(new_set_to_use)
+            df_balances_temp = df_balances_temp[filter]
 
-                    filter = df_balances_temp['Statement_id'].isin(new_set_to_use)
-                    df_balances_temp = df_balances_temp[filter]
+            if len(df_trans_temp) > 0:
+                filter = df_trans_temp['Statement_id'].isin(new_set_to_use)
+                df_trans_temp = df_trans_temp[filter]
 
-                    if len(df_trans_temp) > 0:
-                        filter = df_trans_temp['Statement_id'].isin(new_set_to_use)
-                        df_trans_temp = df_trans_temp[filter]
+            df_statements.append(df_stmts_temp)
+            df_transactions.append(df_trans_temp)
+            df_balances.append(df_balances_temp)
 
-                    df_statements = pd.concat([df_statements, df_stmts_temp])
-                    df_transactions = pd.concat([df_transactions, df_trans_temp])
-                    df_balances = pd.concat([df_balances, df_balances_temp])
+            df_files.append(file_dict)
 
-                    df_files.append(file_dict)
+            if manifest is not None:
+                manifest.record_file(full_path, file_dict['status'], new_set)
 
-                except Exception as e:
-                    file_dict = {'file': file_path,
-                                 'account_id': '',
-                                 'status': f'CAMT053 parsing not successful, reason: {e}'}
-                    print("Could not process as CAMT053 file: ", file_path, f'reason: {e}')
-                    df_files.append(file_dict)
+        except Exception as e:
+            file_dict = {'file': file_path,
+                         'account_id': '',
+                         'status': f'CAMT053 parsing not successful, reason: {e}'}
+            print("Could not process as CAMT053 file: ", file_path, f'reason: {e}')
+            df_files.append(file_dict)
+            # files which could not be processed are not recorded in the manifest, so they are tried again
+            # (and reported again) on the next run
+
+    for file_path in skipped_paths:
+        df_files.append({'file': file_path,
+                         'account_id': '',
+                         'status': 'CAMT053 file unchanged since the last run, skipped'})
 
     df_files = pd.DataFrame(df_files)
     df_duplicates = pd.DataFrame(df_duplicates)
+    df_statements = concat_frames(df_statements)
+    df_balances = concat_frames(df_balances)
+    df_transactions = concat_frames(df_transactions)
 
     if len(df_transactions) > 0:
         df_transactions['ValDt'] = pd.to_datetime(df_transactions['ValDt'], format='%Y-%m-%d')
         df_transactions['BookgDt'] = pd.to_datetime(df_transactions['BookgDt'], format='%Y-%m-%d')
 
-    return df_files, df_statements, df_balances, df_transactions, df_duplicates
\ No newline at end of file
+    return (df_files, df_statements, df_balances, df_transactions, df_duplicates), initial_set
+
+def process_folder2(folder, initial_set=set(), workers=None, manifest=None, minor_units=False):
+    file_paths = [file_path for file_path in os.listdir(folder)
+                  if os.path.isfile(os.path.join(folder, file_path)) and file_path.endswith('.xml')]
+
+    # with a manifest (ProcessedFilesManifest or path to its SQLite file) the ingestion is incremental:
+    # unchanged files are skipped without parsing and statements seen in previous runs are treated as duplicates
+    skipped_paths = []
+    if manifest is not None:
+        if not isinstance(manifest, ProcessedFilesManifest):
+            manifest = ProcessedFilesManifest(manifest)
+            own_manifest = True
+        else:
+            own_manifest = False
+
+        skipped_paths = [file_path for file_path in file_paths
+                         if manifest.is_unchanged(os.path.join(folder, file_path))]
+        skipped_set = set(skipped_paths)
+        file_paths = [file_path for file_path in file_paths if file_path not in skipped_set]
+        initial_set = initial_set | manifest.statement_ids()
+
+    full_paths = [os.path.join(folder, file_path) for file_path in file_paths]
+
+    # files may be parsed in parallel, but the results are processed in the order of the files,
+    # so that detection of duplicate statements does not depend on the number of workers
+    parsed = zip(file_paths, full_paths, parse_camt053_files(full_paths, workers, minor_units))
+    results, initial_set = collect_camt053_results(parsed, initial_set, manifest, skipped_paths)
+
+    if manifest is not None:
+        # the manifest is updated only when the whole folder has been processed
+        manifest.commit()
+        if own_manifest:
+            manifest.close()
+
+    return results
+
+
+RECONCILIATION_COLUMNS = ('Check', 'Account_id', 'Currency', 'Statement_id', 'Date', 'Previous_Statement_id',
+                          'Expected', 'Actual', 'Difference')
+
+def _break_report(check, balances, rows, previous_rows, expected, actual):
+    # builds rows of the reconciliation report for statements at positions rows of balances,
+    # expected and actual amounts are already taken at the same positions
+    report = balances[['Account_id', 'Currency', 'Statement_id', 'Date']].take(rows).reset_index(drop=True)
+    report.insert(0, 'Check', check)
+    if previous_rows is None:
+        report['Previous_Statement_id'] = None
+    else:
+        report['Previous_Statement_id'] = balances['Statement_id'].to_numpy()[previous_rows]
+    report['Expected'] = expected
+    report['Actual'] = actual
+    report['Difference'] = actual - expected
+    return report
+
+def reconcile_statements(df_balances, df_transactions=None):
+    # checks balances of statements returned by process_folder2 (or Camt053.get_balances) with vectorized
+    # grouped operations and returns a report with one row per break:
+    #   'balance' - opening balance + net amount of the entries differs from the closing balance of the statement,
+    #               entries are summed from df_transactions when given, otherwise total_amount of the statement is used
+    #   'continuity' - opening balance differs from the closing balance of the previous statement
+    #                  of the same account and currency (ordered by date)
+    #   'missing balance' - opening or closing balance of the statement is not available
+    # amounts in minor units (integer columns, see minor_units=True) are compared exactly,
+    # float amounts with a tolerance of half of the minor unit of the currency
+    if len(df_balances) == 0 or not {'Opening_Balance', 'Closing_Balance'}.issubset(df_balances.columns):
+        # e.g. an empty folder or a run of process_folder2 with a manifest and no new files
+        return pd.DataFrame(columns=list(RECONCILIATION_COLUMNS))
+
+    balances = df_balances.reset_index(drop=True)
+    opening = balances['Opening_Balance'].array
+    closing = balances['Closing_Balance'].array
+
+    if pd.api.types.is_integer_dtype(closing.dtype):
+        tolerance = np.zeros(len(balances))
+    else:
+        tolerance = 0.5 * 10.0 ** -balances['Currency'].map(currency_exponent).to_numpy(dtype=np.float64)
+
+    if df_transactions is None:
+        net = balances['total_amount'].to_numpy()
+    elif len(df_transactions) == 0:
+        net = 0
+    else:
+        net = df_transactions.groupby('Statement_id', observed=True, sort=False)['Amount'].sum()
+        net = net.reindex(balances['Statement_id'], fill_value=0).to_numpy()
+
+    # opening + net entries == closing for every statement
+    expected = opening + net
+    missing = pd.isna(opening) | pd.isna(closing)
+    outside = pd.Series(closing - expected).abs().gt(tolerance).to_numpy(dtype=bool, na_value=False)
+    rows = np.flatnonzero(~missing & outside)
+    missing_rows = np.flatnonzero(missing)
+
+    reports = [_break_report('balance', balances, rows, None, expected.take(rows), closing.take(rows)),
+               _break_report('missing balance', balances, missing_rows, None,
+                             expected.take(missing_rows), closing.take(missing_rows))]
+
+    # closing balance of a statement == opening balance of the next statement of the same account and currency
+    account_codes = pd.factorize(balances['Account_id'])[0]
+    currency_codes = pd.factorize(balances['Currency'])[0]
+    order = np.lexsort((balances['Date'].to_numpy(), currency_codes, account_codes))
+    same = ((account_codes[order[1:]] == account_codes[order[:-1]]) &
+            (currency_codes[order[1:]] == currency_codes[order[:-1]]))
+    current = order[1:][same]
+    previous = order[:-1][same]
+
+    previous_closing = closing.take(previous)
+    current_opening = opening.take(current)
+    outside = pd.Series(current_opening - previous_closing).abs().gt(tolerance[current])
+    outside = outside.to_numpy(dtype=bool, na_value=False)
+
+    reports.append(_break_report('continuity', balances, current[outside], previous[outside],
+                                 previous_closing[outside], current_opening[outside]))
+
+    reports = [report for report in reports if len(report) > 0] or reports[:1]
+    report = pd.concat(reports, ignore_index=True)
+    return report.sort_values(['Account_id', 'Currency', 'Date'], kind='stable').reset_index(drop=True)
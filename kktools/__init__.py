@@ -1,3 +1,4 @@
 from .core import *
 from .ISO20022 import *
+from .fxrates import *
 __doc__ = """kktools package provides useful tools for finance and treasury specialists"""
\ No newline at end of file
@@ -1,12 +1,70 @@
+import io
+import numpy as np
 import pandas as pd
 import requests
-import xml.etree.ElementTree as ET
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import sqlite3
+import time
+from array import array
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from decimal import Decimal
+from operator import attrgetter
 from lxml import etree
 
-def get_ecb_rates(currency, start_period):
+ECB_ENTRYPOINT = 'https://sdw-wsrest.ecb.europa.eu/service/'
+# formats in which ECB data can be requested: SDMX-CSV (format=csvdata) or SDMX generic data XML, plain or gzip
+# compressed; csv.gz is the smallest on the wire and the fastest to parse (see benchmarks/ecb_wire_formats.py)
+ECB_WIRE_FORMATS = ('csv.gz', 'csv', 'xml.gz', 'xml')
+ECB_WIRE_FORMAT = 'csv.gz'
+
+
+class EcbSession(requests.Session):
+    # requests session for ECB downloads: keep-alive connections are pooled and reused between requests
+    # (also from several threads), every request gets a timeout and failed or throttled requests
+    # are retried with exponential backoff (backoff_factor * 2 ** retry seconds, Retry-After is respected)
+    def __init__(self, timeout=(5, 60), retries=3, backoff_factor=0.5, pool_size=10):
+        super().__init__()
+        self.timeout = timeout
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET']), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+_ecb_session = None
+
+def get_ecb_session():
+    # session shared by all ECB functions which are called without their own session
+    global _ecb_session
+    if _ecb_session is None:
+        _ecb_session = EcbSession()
+    return _ecb_session
+
+
+def get_ecb_rates(currency, start_period, cache=None, offline=False, entrypoint=ECB_ENTRYPOINT, session=None,
+                  wire_format=ECB_WIRE_FORMAT):
+    # with cache (EcbRatesCache or path to its SQLite file) rates are stored locally and later calls download
+    # only observations after the last cached date, with offline=True rates are served from the cache only
+    if cache is None:
+        if offline:
+            raise ValueError('Offline mode requires a cache of ECB rates')
+        return download_ecb_rates(currency, start_period, entrypoint, session, wire_format)
+
+    if not isinstance(cache, EcbRatesCache):
+        with EcbRatesCache(cache) as cache:
+            return cache.get_rates(currency, start_period, offline, entrypoint, session, wire_format)
+    return cache.get_rates(currency, start_period, offline, entrypoint, session, wire_format)
+
+def download_ecb_rates(currency, start_period, entrypoint=ECB_ENTRYPOINT, session=None, wire_format=ECB_WIRE_FORMAT):
     # please see description of request structure here: https://sdw-wsrest.ecb.europa.eu/help/
 
-    entrypoint = 'https://sdw-wsrest.ecb.europa.eu/service/'
     resource = 'data'  # The resource for data queries is always 'data'
     flowRef = 'EXR'  # Dataflow describing the data that needs to be returned,
                     # exchange rates in this case
@@ -16,31 +74,285 @@ def get_ecb_rates(currency, start_period):
 
     request_url = entrypoint + resource + '/' + flowRef + '/' + key
 
-    # Make the HTTP request
-    response = requests.get(request_url, params = parameters)
+    # the response is parsed while it is being received
+    currencies, dates, rates = fetch_ecb_series(request_url, parameters, session, wire_format)
+
+    df = pd.DataFrame({'date': pd.to_datetime(dates, errors='coerce'), 'rate_value': rates})
+    df.dropna(inplace=True)
+
+    return df
+
+
+def get_ecb_rates_many(currencies, start_period, wide=False, chunk_size=None, window_years=None, workers=None,
+                       entrypoint=ECB_ENTRYPOINT, session=None, wire_format=ECB_WIRE_FORMAT):
+    # downloads daily rates of several currencies with one request per chunk_size currencies (one request for all
+    # currencies when chunk_size is None) using the SDMX key D.USD+GBP+JPY.EUR.SP00.A; with window_years the period
+    # is also split into windows of that many years and with workers > 1 the requests run in parallel threads;
+    # returns a long DataFrame (currency, date, rate_value) or with wide=True rates indexed by date with a column per currency
+    currencies = list(currencies)
+    if len(currencies) == 0:
+        # nothing to download, the result has the same columns (or index) as for currencies without observations
+        df = ecb_rates_frame(*EcbSeriesTarget().close())
+        if wide:
+            df = df.set_index('date')[[]]
+        return df
+
+    if chunk_size is None:
+        chunk_size = max(1, len(currencies))
+    chunks = [currencies[i:i + chunk_size] for i in range(0, len(currencies), chunk_size)]
+
+    windows = [(start_period, None)]
+    if window_years is not None:
+        starts = pd.date_range(pd.Timestamp(start_period), pd.Timestamp.today(), freq=pd.DateOffset(years=window_years))
+        windows = [(start.strftime('%Y-%m-%d'), (start + pd.DateOffset(years=window_years, days=-1)).strftime('%Y-%m-%d'))
+                   for start in starts]
+
+    if session is None:
+        session = get_ecb_session()
+    tasks = [(chunk, start, end) for chunk in chunks for start, end in windows]
+
+    def download(task):
+        chunk, start, end = task
+        return download_ecb_rates_many(chunk, start, entrypoint, session, end_period=end, wire_format=wire_format)
 
-    xml_data = response.text  # the data returned is in XML format, so we need to parse it
-    root = ET.fromstring(xml_data)
+    if workers is None or workers <= 1:
+        frames = list(map(download, tasks))
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            frames = list(executor.map(download, tasks))
+    df = pd.concat(frames, ignore_index=True)
 
-    rate_list = []
-    for k in range(2, len(root[1][0])):  # the data starts at xml-tree element root[1][0],
-        # this can be checked by looking at received data in the browser
-        date = root[1][0][k][0].attrib['value']
-        rate = root[1][0][k][1].attrib['value']
-        rate_list.append((date, rate))
+    if len(windows) > 1:
+        # observations of a currency come from several windows, they are put back in the order of currencies and dates
+        position = df['currency'].map({currency: position for position, currency in enumerate(currencies)})
+        df = df.iloc[np.lexsort((df['date'].to_numpy(), position.to_numpy()))].reset_index(drop=True)
 
-    df = pd.DataFrame(rate_list)
-    df.columns = ['date', 'rate_value']
-    df['rate_value'] = pd.to_numeric(df['rate_value'], errors='coerce')
-    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    if wide:
+        df = df.pivot(index='date', columns='currency', values='rate_value')
+        df = df.reindex(columns=[currency for currency in currencies if currency in df.columns])
+        df.columns.name = None
+
+    return df
+
+def download_ecb_rates_many(currencies, start_period, entrypoint=ECB_ENTRYPOINT, session=None, end_period=None,
+                            wire_format=ECB_WIRE_FORMAT):
+    key = 'D.' + '+'.join(currencies) + '.EUR.SP00.A'
+    request_url = entrypoint + 'data/EXR/' + key
+    parameters = {'startPeriod': start_period}
+    if end_period is not None:
+        parameters['endPeriod'] = end_period
+
+    return ecb_rates_frame(*fetch_ecb_series(request_url, parameters, session, wire_format))
+
+def ecb_rates_frame(currencies, dates, rates):
+    # long DataFrame (currency, date, rate_value) of parsed observations, missing rates are dropped
+    df = pd.DataFrame({'currency': currencies, 'date': pd.to_datetime(dates, errors='coerce'), 'rate_value': rates})
     df.dropna(inplace=True)
+    df.reset_index(drop=True, inplace=True)
 
     return df
 
-def get_last_ecb_rates():
+def fetch_ecb_series(request_url, parameters, session=None, wire_format=ECB_WIRE_FORMAT):
+    # downloads ECB data in the given wire format (see ECB_WIRE_FORMATS) and parses it from the response stream
+    # while it is being received, returns the same arrays as parse_ecb_series whatever the format
+    # (empty when ECB answers 404, i.e. no observations in the period)
+    if wire_format not in ECB_WIRE_FORMATS:
+        raise ValueError(f'Unknown ECB wire format {wire_format!r}, expected one of {ECB_WIRE_FORMATS}')
+    data_format, _, compression = wire_format.partition('.')
+
+    parse = parse_ecb_series
+    if data_format == 'csv':
+        parameters = dict(parameters, format='csvdata')
+        parse = parse_ecb_csv
+    headers = {'Accept-Encoding': 'gzip' if compression else 'identity'}
+
+    if session is None:
+        session = get_ecb_session()
+
+    with session.get(request_url, params=parameters, headers=headers, stream=True) as response:
+        if response.status_code == 404:
+            return parse(b'')
+        response.raise_for_status()
+        # compressed responses are decompressed by urllib3 while they are read
+        response.raw.decode_content = True
+        return parse(response.raw)
+
+def parse_ecb_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+class EcbSeriesTarget:
+    # lxml parser target which collects observations of an SDMX generic data message while it is being parsed,
+    # no element tree is built; elements are matched by their local names and id/value attributes, not by position
+    def __init__(self):
+        self.series_currencies = []
+        self.series_lengths = []
+        self.dates = []
+        self.rates = array('d')
+        self._in_series_key = False
+
+    def start(self, tag, attrib):
+        name = tag.rpartition('}')[2]
+        if name == 'Obs':
+            if not self.series_lengths:
+                raise ValueError('Malformed SDMX message from ECB: observation (Obs) before any series (SeriesKey)')
+            self._in_series_key = False
+            self.series_lengths[-1] += 1
+            self.dates.append(None)
+            self.rates.append(np.nan)
+        elif name == 'ObsDimension':
+            self.dates[-1] = attrib.get('value')
+        elif name == 'ObsValue':
+            self.rates[-1] = parse_ecb_float(attrib.get('value'))
+        elif name == 'SeriesKey':
+            self._in_series_key = True
+            self.series_currencies.append(None)
+            self.series_lengths.append(0)
+        elif name == 'Value':
+            if self._in_series_key and attrib.get('id') == 'CURRENCY':
+                self.series_currencies[-1] = attrib.get('value')
+        elif name == 'Attributes':
+            self._in_series_key = False
+
+    def close(self):
+        currencies = np.repeat(np.array(self.series_currencies, dtype=object), self.series_lengths)
+        return currencies, np.array(self.dates, dtype=object), np.frombuffer(self.rates, dtype=np.float64)
+
+
+def parse_ecb_series(source, chunk_size=1 << 16):
+    # parses an SDMX generic data message from bytes or a binary file-like object (e.g. a streamed response)
+    # chunk by chunk and returns numpy arrays of currencies, dates (as strings) and rates of all observations
+    target = EcbSeriesTarget()
+    parser = etree.XMLParser(target=target, huge_tree=True)
+    fed = False
+
+    if isinstance(source, (bytes, bytearray)):
+        if len(source) > 0:
+            parser.feed(source)
+            fed = True
+    else:
+        chunk = source.read(chunk_size)
+        while chunk:
+            parser.feed(chunk)
+            fed = True
+            chunk = source.read(chunk_size)
+
+    if fed:
+        return parser.close()
+    return target.close()
+
+
+def parse_ecb_csv(source):
+    # parses an SDMX-CSV message (format=csvdata) from bytes or a binary file-like object,
+    # returns the same arrays as parse_ecb_series; missing observations are empty or NaN in OBS_VALUE
+    if isinstance(source, (bytes, bytearray)):
+        if len(source) == 0:
+            return EcbSeriesTarget().close()
+        source = io.BytesIO(source)
+
+    df = pd.read_csv(source, usecols=['CURRENCY', 'TIME_PERIOD', 'OBS_VALUE'],
+                     dtype={'CURRENCY': object, 'TIME_PERIOD': object, 'OBS_VALUE': np.float64},
+                     keep_default_na=False, na_values={'OBS_VALUE': ['', 'NaN']})
+    return (df['CURRENCY'].to_numpy(dtype=object), df['TIME_PERIOD'].to_numpy(dtype=object),
+            df['OBS_VALUE'].to_numpy(dtype=np.float64))
+
+
+class EcbRatesCache:
+    # local SQLite cache of daily ECB rates per currency; a currency is downloaded once from the earliest
+    # requested start period and afterwards refreshed incrementally from its last cached date,
+    # at most once per ttl seconds (ttl=None refreshes on every call)
+    def __init__(self, db_path, ttl=3600):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS ecb_rates (currency TEXT, date TEXT, rate_value REAL, '
+                           'PRIMARY KEY (currency, date)) WITHOUT ROWID')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS ecb_series (currency TEXT PRIMARY KEY, start_period TEXT, '
+                           'refreshed_at REAL, accessed_at REAL)')
+        self._conn.commit()
+
+    def get_rates(self, currency, start_period, offline=False, entrypoint=ECB_ENTRYPOINT, session=None,
+                  wire_format=ECB_WIRE_FORMAT):
+        start_period = pd.Timestamp(start_period).strftime('%Y-%m-%d')
+        series = self._conn.execute('SELECT start_period, refreshed_at FROM ecb_series WHERE currency = ?',
+                                    (currency,)).fetchone()
+        now = time.time()
+
+        if offline:
+            if series is None:
+                raise LookupError(f'No cached ECB rates for {currency}')
+        elif series is None or start_period < series[0]:
+            # the requested period is not covered by the cache, the whole series is downloaded again
+            df = download_ecb_rates(currency, start_period, entrypoint, session, wire_format)
+            self._conn.execute('DELETE FROM ecb_rates WHERE currency = ?', (currency,))
+            self._store(currency, df)
+            self._conn.execute('INSERT OR REPLACE INTO ecb_series VALUES (?, ?, ?, ?)',
+                               (currency, start_period, now, now))
+        elif self.ttl is None or now - series[1] >= self.ttl:
+            # the last cached date is downloaded again together with newer observations, so that its revision is kept
+            last_date = self._conn.execute('SELECT MAX(date) FROM ecb_rates WHERE currency = ?',
+                                           (currency,)).fetchone()[0]
+            df = download_ecb_rates(currency, last_date or series[0], entrypoint, session, wire_format)
+            self._store(currency, df)
+            self._conn.execute('UPDATE ecb_series SET refreshed_at = ? WHERE currency = ?', (now, currency))
+
+        self._conn.execute('UPDATE ecb_series SET accessed_at = ? WHERE currency = ?', (now, currency))
+        self._conn.commit()
+        return self.cached_rates(currency, start_period)
+
+    def cached_rates(self, currency, start_period=None):
+        # returns cached rates of the currency in the same form as get_ecb_rates
+        rows = self._conn.execute('SELECT date, rate_value FROM ecb_rates WHERE currency = ? AND date >= ? '
+                                  'ORDER BY date', (currency, start_period or '')).fetchall()
+        df = pd.DataFrame(rows, columns=['date', 'rate_value'])
+        df['rate_value'] = df['rate_value'].astype('float64')
+        df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+        return df
+
+    def _store(self, currency, df):
+        dates = df['date'].dt.strftime('%Y-%m-%d')
+        self._conn.executemany('INSERT OR REPLACE INTO ecb_rates VALUES (?, ?, ?)',
+                               zip([currency] * len(df), dates, df['rate_value'].astype(float)))
+
+    def currencies(self):
+        return [row[0] for row in self._conn.execute('SELECT currency FROM ecb_series ORDER BY currency')]
+
+    def evict(self, max_age):
+        # removes currencies which have not been requested for max_age seconds, returns their codes
+        threshold = time.time() - max_age
+        evicted = [row[0] for row in self._conn.execute('SELECT currency FROM ecb_series WHERE accessed_at < ?',
+                                                        (threshold,))]
+        for currency in evicted:
+            self.clear(currency, commit=False)
+        self._conn.commit()
+        return evicted
+
+    def clear(self, currency=None, commit=True):
+        # removes the currency (or all currencies) from the cache
+        if currency is None:
+            self._conn.execute('DELETE FROM ecb_rates')
+            self._conn.execute('DELETE FROM ecb_series')
+        else:
+            self._conn.execute('DELETE FROM ecb_rates WHERE currency = ?', (currency,))
+            self._conn.execute('DELETE FROM ecb_series WHERE currency = ?', (currency,))
+        if commit:
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def get_last_ecb_rates(entrypoint=ECB_ENTRYPOINT, session=None, wire_format=ECB_WIRE_FORMAT):
     # please see description of request structure here: https://sdw-wsrest.ecb.europa.eu/help/
 
-    entrypoint = 'https://sdw-wsrest.ecb.europa.eu/service/'
     resource = 'data'  # The resource for data queries is always'data'
     flowRef = 'EXR'  # Dataflow describing the data that needs to be returned,
     # exchange rates in this case
@@ -50,24 +362,102 @@ def get_last_ecb_rates():
 
     request_url = entrypoint + resource + '/' + flowRef + '/' + key
 
-    # Make the HTTP request
-    response = requests.get(request_url, params=parameters)
+    # the response is parsed while it is being received, one (last) observation per currency
+    currencies, dates, rates = fetch_ecb_series(request_url, parameters, session, wire_format)
+
+    df = pd.DataFrame({'currency': currencies, 'date': pd.to_datetime(dates, errors='coerce'), 'rate_value': rates})
 
-    xml_data = response.text  # the data returned is in XML format, so we need to parse it
-    root = ET.fromstring(xml_data)
-    rate_list = []
+    return df
 
-    for child in root[1]:
-        rate_list.append((child[0][1].attrib['value'],
-                          child[2][0].attrib['value'], child[2][1].attrib['value']))
+class Record(Mapping):
+    # base class for compact records stored in __slots__ instead of a per-instance dict.
+    # Subclasses list attribute names in __slots__ and, if they differ, the corresponding dict keys in _keys.
+    # Records behave as read-only dicts (record['Amount'], keys(), items(), dict(record), == with dicts),
+    # so code written for dict rows keeps working.
+    __slots__ = ()
+    _keys = ()
+    _attrs = {}
 
-    df = pd.DataFrame(rate_list)
-    df.columns = ['currency', 'date', 'rate_value']
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not cls._keys:
+            cls._keys = tuple(cls.__slots__)
+        cls._attrs = dict(zip(cls._keys, cls.__slots__))
 
-    df['rate_value'] = pd.to_numeric(df['rate_value'], errors='coerce')
-    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    def __init__(self, *values):
+        for attr, value in zip(self.__slots__, values):
+            setattr(self, attr, value)
+
+    @classmethod
+    def from_dict(cls, data_dict):
+        return cls(*[data_dict[key] for key in cls._keys])
+
+    def to_dict(self):
+        return {key: getattr(self, attr) for key, attr in self._attrs.items()}
+
+    def __getitem__(self, key):
+        return getattr(self, self._attrs[key])
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return type(self).__name__ + '(' + repr(self.to_dict()) + ')'
+
+
+def records_to_dataframe(records):
+    # builds a DataFrame column by column from a list of records of the same type
+    if len(records) == 0:
+        return pd.DataFrame()
+
+    record_type = type(records[0])
+    rows = list(map(attrgetter(*record_type.__slots__), records))
+    return pd.DataFrame(rows, columns=list(record_type._keys))
+
+
+# ISO 4217 currencies whose minor unit is not 1/100 of the currency unit, all other currencies have 2 decimals
+CURRENCY_EXPONENTS = {'BIF': 0, 'CLP': 0, 'DJF': 0, 'GNF': 0, 'ISK': 0, 'JPY': 0, 'KMF': 0, 'KRW': 0, 'PYG': 0,
+                      'RWF': 0, 'UGX': 0, 'UYI': 0, 'VND': 0, 'VUV': 0, 'XAF': 0, 'XOF': 0, 'XPF': 0,
+                      'BHD': 3, 'IQD': 3, 'JOD': 3, 'KWD': 3, 'LYD': 3, 'OMR': 3, 'TND': 3,
+                      'CLF': 4, 'UYW': 4}
+
+
+def currency_exponent(currency):
+    # number of decimals of the minor unit of the currency
+    return CURRENCY_EXPONENTS.get(currency, 2)
+
+
+def to_minor_units(amount, currency):
+    # converts a decimal amount string (e.g. "1234.5" in EUR) to an exact integer number of minor units (123450),
+    # trailing zeros beyond the minor unit are allowed ("100.00" in JPY), other extra decimals raise ValueError
+    exponent = currency_exponent(currency)
+    whole, _, fraction = amount.strip().partition('.')
+    if len(fraction) > exponent:
+        if fraction[exponent:].strip('0'):
+            raise ValueError(f'Amount {amount} has more decimals than the minor unit of {currency}')
+        fraction = fraction[:exponent]
+    return int(whole + fraction.ljust(exponent, '0'))
+
+
+def from_minor_units(amount, currency):
+    # converts an integer number of minor units back to an exact Decimal amount in the currency
+    return Decimal(int(amount)).scaleb(-currency_exponent(currency))
+
+
+def map_files(parse_file, file_paths, workers=None):
+    # yields parse_file(file_path) for every file in the order of file_paths, with workers > 1 the files are parsed
+    # in parallel in a pool of processes (parse_file has to be picklable then: a module level function or a partial
+    # of one); files are sent to the workers in chunks, so that short files do not wait on inter-process round trips
+    if workers is None or workers <= 1:
+        yield from map(parse_file, file_paths)
+    else:
+        chunksize = max(1, len(file_paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(parse_file, file_paths, chunksize=chunksize)
 
-    return df
 
 def df_to_excel(file_name, df, worksheet_name="Sheet1", max_length=25):
     with pd.ExcelWriter(file_name, engine='xlsxwriter', datetime_format='dd/mm/yyyy') as writer:
@@ -83,7 +473,7 @@ def df_to_excel(file_name, df, worksheet_name="Sheet1", max_length=25):
             for column in list(df.columns):
                 series = df[column]
                 max_len = max((
-                    series.astype(str).map(len).max(),  # len of largest item
+                    series.map(str).map(len).max(),  # len of largest item
                     len(str(series.name))  # len of column name/header
                     )) + 1  # adding a little extra space
                 max_len = min(max_len, max_length)  # we want to limit still the length of the column with max_length
@@ -116,7 +506,7 @@ def dfs_to_excel(file_name, df_list, max_length=25, sheet_names = []):
                 for column in list(df.columns):
                     series = df[column]
                     max_len = max((
-                        series.astype(str).map(len).max(),  # len of largest item
+                        series.map(str).map(len).max(),  # len of largest item
                         len(str(series.name))  # len of column name/header
                     )) + 1  # adding a little extra space
                     max_len = min(max_len, max_length)  # we want to limit still the length of the column with max_length
@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+from .core import ECB_ENTRYPOINT, get_ecb_rates_many
+
+# keys of the rate index are (currency position << KEY_SHIFT) + days since 1970 + DAY_OFFSET
+KEY_SHIFT = 32
+DAY_OFFSET = 1 << 31
+EUR_POSITION = -2
+
+
+def concat_rate_frames(frames):
+    # dict of currency -> output of get_ecb_rates to one long DataFrame (currency, date, rate_value)
+    return pd.concat([df.assign(currency=currency)[['currency', 'date', 'rate_value']]
+                      for currency, df in frames.items()], ignore_index=True)
+
+
+class FxRateStore:
+    # daily ECB reference rates (units of currency per 1 EUR) of several currencies in date-sorted numpy arrays.
+    # Rates of all currencies are stored back to back and looked up with one searchsorted over (currency, date)
+    # keys, so millions of amounts are converted in one call; a date without a rate (weekend, TARGET holiday)
+    # gets the rate of the previous business day
+    def __init__(self, rates):
+        # rates: long DataFrame with currency, date and rate_value columns, e.g. output of get_ecb_rates_many
+        rates = rates[rates['rate_value'].notna() & rates['date'].notna()]
+        self.currencies = sorted(set(rates['currency'].unique()) - {'EUR'})
+        self._positions = {currency: position for position, currency in enumerate(self.currencies)}
+        self._positions['EUR'] = EUR_POSITION
+
+        positions = rates['currency'].map(self._positions).to_numpy(dtype=np.int64)
+        days = rates['date'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+        keep = positions >= 0
+        positions, days = positions[keep], days[keep]
+        order = np.lexsort((days, positions))
+
+        self._keys = (positions[order] << KEY_SHIFT) + days[order] + DAY_OFFSET
+        self._rates = rates['rate_value'].to_numpy(dtype=np.float64)[keep][order]
+        # rates of the currency at position i are self._rates[self._bounds[i]:self._bounds[i + 1]]
+        self._bounds = np.searchsorted(positions[order], np.arange(len(self.currencies) + 1))
+
+    @classmethod
+    def from_ecb(cls, currencies, start_period, entrypoint=ECB_ENTRYPOINT, session=None, **kwargs):
+        # downloads the rates with get_ecb_rates_many (kwargs: chunk_size, window_years, workers, wire_format)
+        return cls(get_ecb_rates_many(currencies, start_period, entrypoint=entrypoint, session=session, **kwargs))
+
+    @classmethod
+    def from_frames(cls, frames):
+        # frames: dict of currency -> output of get_ecb_rates (date and rate_value columns)
+        return cls(concat_rate_frames(frames))
+
+    def __contains__(self, currency):
+        return currency in self._positions
+
+    def series(self, currency):
+        # returns date-sorted arrays of dates (datetime64[D]) and rates of the currency
+        position = self._positions[currency]
+        if position == EUR_POSITION:
+            raise KeyError('EUR is the base currency of ECB rates')
+        start, end = self._bounds[position], self._bounds[position + 1]
+        days = self._keys[start:end] - (position << KEY_SHIFT) - DAY_OFFSET
+        return days.astype('datetime64[D]'), self._rates[start:end]
+
+    def _lookup_positions(self, currencies, size, errors):
+        if np.ndim(currencies) == 0:
+            currencies = np.full(size, currencies, dtype=object)
+        elif not isinstance(currencies, (pd.Series, pd.Index)):
+            currencies = np.asarray(currencies, dtype=object)
+        codes, uniques = pd.factorize(currencies)
+        # the last element is used for missing currencies (code -1)
+        lookup = np.array([self._positions.get(currency, -1) for currency in uniques] + [-1], dtype=np.int64)
+        if errors == 'raise':
+            unknown = [currency for currency in uniques if currency not in self._positions]
+            if unknown:
+                raise KeyError(f'No ECB rates for {", ".join(map(str, sorted(unknown)))}')
+        elif errors != 'coerce':
+            raise ValueError("errors must be 'raise' or 'coerce'")
+        return lookup[codes]
+
+    def rates(self, currencies, dates, errors='raise'):
+        # as-of rates (units of currency per 1 EUR) for arrays of currencies and dates, NaN where there is no rate
+        # on or before the date; unknown currencies raise KeyError, with errors='coerce' they get NaN
+        dates = np.asarray(pd.to_datetime(dates), dtype='datetime64[D]')
+        size = dates.size if dates.ndim else np.size(currencies)
+        if dates.ndim == 0:
+            dates = np.full(size, dates)
+        positions = self._lookup_positions(currencies, size, errors)
+
+        nat = np.isnat(dates)
+        days = np.where(nat, 0, dates.astype(np.int64))
+        keys = (np.maximum(positions, 0) << KEY_SHIFT) + days + DAY_OFFSET
+        index = np.searchsorted(self._keys, keys, side='right') - 1
+
+        found = (positions >= 0) & ~nat & (index >= 0)
+        if len(self._keys):
+            index = np.maximum(index, 0)
+            found &= (self._keys[index] >> KEY_SHIFT) == positions
+            result = np.where(found, self._rates[index], np.nan)
+        else:
+            result = np.full(size, np.nan)
+        result[(positions == EUR_POSITION) & ~nat] = 1.0
+        return result
+
+    def convert(self, amounts, currencies, dates, to='EUR', errors='raise'):
+        # converts amounts in currencies to the target currency at the as-of rates of the dates,
+        # e.g. df['AmountEUR'] = store.convert(df['Amount'], df['Currency'], df['BookgDt'])
+        amounts = np.asarray(amounts, dtype=np.float64)
+        result = amounts / self.rates(currencies, dates, errors)
+        if to != 'EUR':
+            result *= self.rates(to, dates, errors)
+        return result
+
+
+class CrossRates:
+    # cross rates of all currencies against each other derived from ECB rates against EUR (triangulation):
+    # units of quote currency per 1 unit of base currency = rate of quote / rate of base on the same date.
+    # Rates against EUR are kept in a dates x currencies matrix (EUR first, always 1), the full cube or
+    # single pairs are computed from it on request
+    def __init__(self, rates, ffill=False):
+        # rates: long DataFrame (currency, date, rate_value) from get_ecb_rates_many or get_last_ecb_rates,
+        # or dict of currency -> output of get_ecb_rates; with ffill=True a currency without a rate
+        # on a date gets its previous rate
+        if isinstance(rates, Mapping):
+            rates = concat_rate_frames(rates)
+        rates = rates[rates['rate_value'].notna() & rates['date'].notna()]
+
+        self.currencies = ['EUR'] + sorted(set(rates['currency'].unique()) - {'EUR'})
+        self._positions = {currency: position for position, currency in enumerate(self.currencies)}
+        self.dates, date_index = np.unique(rates['date'].to_numpy(), return_inverse=True)
+        currency_index = rates['currency'].map(self._positions).to_numpy(dtype=np.int64)
+
+        self.eur_rates = np.full((len(self.dates), len(self.currencies)), np.nan)
+        self.eur_rates[date_index, currency_index] = rates['rate_value'].to_numpy(dtype=np.float64)
+        if ffill:
+            # row of the last available rate of each currency up to each date
+            rows = np.where(np.isnan(self.eur_rates), 0, np.arange(len(self.dates))[:, np.newaxis])
+            np.maximum.accumulate(rows, axis=0, out=rows)
+            self.eur_rates = self.eur_rates[rows, np.arange(len(self.currencies))]
+        self.eur_rates[:, 0] = 1.0
+
+    def cube(self, dtype=np.float64):
+        # dates x base x quote array of all cross rates, axes are labelled by self.dates and self.currencies;
+        # needs len(dates) * len(currencies) ** 2 values, dtype=np.float32 halves the memory
+        eur_rates = self.eur_rates.astype(dtype, copy=False)
+        return eur_rates[:, np.newaxis, :] / eur_rates[:, :, np.newaxis]
+
+    def pair(self, base, quote):
+        # Series of units of quote currency per 1 unit of base currency indexed by date, the cube is not built
+        base_rates = self.eur_rates[:, self._positions[base]]
+        quote_rates = self.eur_rates[:, self._positions[quote]]
+        return pd.Series(quote_rates / base_rates, index=pd.Index(self.dates, name='date'), name=base + '/' + quote)
+
+    def __getitem__(self, pair):
+        # rates['USD/JPY'] is rates.pair('USD', 'JPY')
+        base, quote = pair.split('/')
+        return self.pair(base, quote)
+
+    def matrix(self, date=None):
+        # base x quote DataFrame of cross rates on the date (or the previous date with rates, the last date by default)
+        position = len(self.dates) - 1
+        if date is not None:
+            position = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(date)), side='right') - 1
+            if position < 0:
+                raise KeyError(f'No rates on or before {date}')
+        eur_rates = self.eur_rates[position]
+        return pd.DataFrame(eur_rates[np.newaxis, :] / eur_rates[:, np.newaxis],
+                            index=pd.Index(self.currencies, name='base'), columns=pd.Index(self.currencies, name='quote'))
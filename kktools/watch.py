@@ -0,0 +1,354 @@
+import datetime
+import os
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from .core import dfs_to_excel
+from .FX import FxOutrightData, FxSwapData, TradeColumns, convert_trades_to_FIS, parse_360T_file, save_FIS
+from .ISO20022 import ProcessedFilesManifest, collect_camt053_results, parse_camt053_file
+
+
+def parse_when_settled(parse_file, path, settle_time):
+    # waits until the file has not been changed for settle_time seconds (it may still be being written),
+    # then parses it with parse_file; returns (result, None) or (None, reason) like parse_file
+    try:
+        stat = os.stat(path)
+        while time.time() - stat.st_mtime < settle_time:
+            time.sleep(settle_time)
+            previous, stat = stat, os.stat(path)
+            if (stat.st_size, stat.st_mtime_ns) == (previous.st_size, previous.st_mtime_ns):
+                break
+    except OSError as e:
+        return None, str(e)
+    return parse_file(path)
+
+
+class FolderWatcher:
+    # long-running service around a file parser: files landing in folder are queued as soon as they appear
+    # (file system events of watchdog, i.e. inotify on Linux, when it is installed, otherwise polling of the folder),
+    # parsed by a pool of workers and handed to on_batch in micro-batches of up to batch_size files or
+    # batch_interval seconds. A file is moved to archive_folder only after on_batch has returned for its batch,
+    # a failing batch is retried, so that no file is lost if the service stops or the output cannot be written.
+    #   parse_file(path) -> (result, None) or (None, reason), e.g. parse_360T_file or parse_camt053_file;
+    #                       with processes=True it has to be picklable (module level function or partial of one)
+    #   on_batch(batch) - batch is a list of (path, result) of parsed files
+    #   on_error(path, reason) - called for files which could not be parsed or, after on_batch, could not be
+    #                            archived; they stay in folder and are not processed again until they change,
+    #                            so that a file which cannot be archived is not exported twice
+    # Queues of files to parse and of parsed results are bounded by queue_size, when the workers or on_batch
+    # fall behind the intake blocks instead of growing memory.
+    def __init__(self, folder, archive_folder, parse_file, on_batch, on_error=None, suffixes=None, workers=4,
+                 processes=False, batch_size=100, batch_interval=2.0, queue_size=1000, poll_interval=1.0,
+                 settle_time=0.5, use_watchdog=None):
+        self.folder = folder
+        self._folder_path = os.path.abspath(folder)
+        self.archive_folder = archive_folder
+        self.parse_file = parse_file
+        self.on_batch = on_batch
+        self.on_error = on_error or self._print_error
+        self.suffixes = tuple(suffixes) if suffixes else None
+        self.workers = workers
+        self.processes = processes
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.use_watchdog = use_watchdog
+
+        self.files_processed = 0
+        self.files_failed = 0
+        self.batches = 0
+
+        self._files = queue.Queue(queue_size)
+        self._results = queue.Queue(queue_size)
+        self._in_flight = threading.BoundedSemaphore(max(1, workers) * 2)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._failed = {}
+        self._stopping = threading.Event()
+        self._threads = []
+        self._observer = None
+
+    @staticmethod
+    def _print_error(path, reason):
+        print(f'\n Could not process file: {os.path.basename(path)}, reason: {reason}')
+
+    def _put(self, target_queue, item):
+        # blocking put which gives up when the watcher is stopping
+        while not self._stopping.is_set():
+            try:
+                target_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def submit(self, path):
+        # queues the file unless it is already queued or it failed and has not changed since
+        if self.suffixes is not None and not path.endswith(self.suffixes):
+            return
+        if os.path.dirname(os.path.abspath(path)) != self._folder_path:
+            # e.g. a file moved from the folder to the archive
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        if not os.path.isfile(path):
+            return
+
+        with self._lock:
+            if path in self._pending or self._failed.get(path) == (stat.st_size, stat.st_mtime_ns):
+                return
+            self._pending.add(path)
+        if not self._put(self._files, path):
+            with self._lock:
+                self._pending.discard(path)
+
+    def scan(self):
+        # queues all files currently in the folder, used at start and by the polling fallback
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    self.submit(os.path.join(self.folder, entry.name))
+
+    def _start_observer(self):
+        # inotify (or the native API of the platform) through watchdog, returns False when it is not available
+        if self.use_watchdog is False:
+            return False
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            if self.use_watchdog:
+                raise ImportError('watchdog is required for event based watching, install it with pip install watchdog')
+            return False
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory or event.event_type not in ('created', 'moved', 'modified', 'closed'):
+                    return
+                watcher.submit(getattr(event, 'dest_path', '') or event.src_path)
+
+        self._observer = Observer()
+        self._observer.schedule(Handler(), self.folder, recursive=False)
+        self._observer.start()
+        return True
+
+    def _poll(self):
+        while not self._stopping.wait(self.poll_interval):
+            self.scan()
+
+    def _dispatch(self):
+        # takes queued files and submits them to the pool, at most 2 * workers files are parsed or waiting at once
+        if self.processes:
+            executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            while not self._stopping.is_set():
+                try:
+                    path = self._files.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                self._in_flight.acquire()
+                future = executor.submit(parse_when_settled, self.parse_file, path, self.settle_time)
+                future.add_done_callback(partial(self._parsed, path))
+        finally:
+            # files which are already being parsed are finished and handed to the last batch
+            executor.shutdown(wait=True)
+            self._results.put(None)
+
+    def _parsed(self, path, future):
+        try:
+            result, reason = future.result()
+        except Exception as e:
+            result, reason = None, str(e)
+        self._in_flight.release()
+        self._results.put((path, result, reason))
+
+    def _collect(self):
+        batch = []
+        started = None
+        while True:
+            timeout = None if started is None else max(0.0, started + self.batch_interval - time.monotonic())
+            try:
+                item = self._results.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+
+            if item is None:
+                break
+            if item:
+                path, result, reason = item
+                if result is None:
+                    self._fail(path, reason)
+                else:
+                    batch.append((path, result))
+                    if started is None:
+                        started = time.monotonic()
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() - started >= self.batch_interval):
+                self._flush(batch)
+                batch = []
+                started = None
+
+        if batch:
+            self._flush(batch, retry=False)
+
+    def _hold(self, path):
+        # keeps the file out of the queue until its size or modification time changes
+        with self._lock:
+            self._pending.discard(path)
+            try:
+                stat = os.stat(path)
+                self._failed[path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                pass
+
+    def _fail(self, path, reason):
+        self.files_failed += 1
+        self._hold(path)
+        self.on_error(path, reason)
+
+    def _flush(self, batch, retry=True):
+        # hands the batch to on_batch and archives its files; a failing batch is retried after batch_interval,
+        # which also holds back the workers and the intake through the bounded queues
+        while True:
+            try:
+                self.on_batch(batch)
+                break
+            except Exception as e:
+                print(f'\n Could not process batch of {len(batch)} files, reason: {e}')
+                if not retry or self._stopping.wait(self.batch_interval):
+                    # the files stay in the folder and are processed after a restart
+                    return
+
+        for path, _ in batch:
+            file_name = os.path.basename(path)
+            try:
+                shutil.move(path, os.path.join(self.archive_folder, file_name))
+            except OSError as e:
+                # the file has been processed already, it must not be picked up and processed again
+                self._hold(path)
+                self.on_error(path, f'processed but could not be archived: {e}')
+                continue
+            with self._lock:
+                self._pending.discard(path)
+        self.files_processed += len(batch)
+        self.batches += 1
+
+    def start(self):
+        self._stopping.clear()
+        self._threads = [threading.Thread(target=self._dispatch, name='watcher-dispatch', daemon=True),
+                         threading.Thread(target=self._collect, name='watcher-batches', daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+        # events are watched before the first scan, so that no file landing in between is missed
+        if not self._start_observer():
+            self._threads.append(threading.Thread(target=self._poll, name='watcher-poll', daemon=True))
+            self._threads[-1].start()
+        self.scan()
+        return self
+
+    def stop(self):
+        # stops the intake, files which are being parsed are finished and written in the last batch,
+        # files still waiting in the queue stay in the folder
+        self._stopping.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        with self._lock:
+            self._pending.clear()
+        while not self._files.empty():
+            self._files.get_nowait()
+
+    def run_forever(self):
+        self.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def watch_360T_folder(source_path, archive_folder, output_path, company_code, BU_DICT, CP_DICT, **options):
+    # FolderWatcher which converts 360T confirmations to FIS format as soon as they land, every micro-batch is
+    # written to its own <time>_forwards.xlsx / <time>_swaps.xlsx files (options: see FolderWatcher)
+    def save_batch(batch):
+        swaps = TradeColumns(FxSwapData)
+        forwards = TradeColumns(FxOutrightData)
+        for path, data in batch:
+            if data['product_name'] == 'fxOutright':
+                forwards.append(data, os.path.basename(path))
+            if data['product_name'] == 'fxSwap':
+                swaps.append(data, os.path.basename(path))
+        df_forwards, df_swaps = convert_trades_to_FIS(forwards, swaps, BU_DICT, CP_DICT)
+        save_FIS(df_forwards, df_swaps, output_path, time_format="%Y%m%d%H%M%S%f")
+
+    parse_file = partial(parse_360T_file, company_code=company_code)
+    return FolderWatcher(source_path, archive_folder, parse_file, save_batch, **options)
+
+
+def watch_camt053_folder(folder, archive_folder, output_path=None, on_output=None, manifest=None, minor_units=False,
+                         **options):
+    # FolderWatcher which processes CAMT053 files as soon as they land, every micro-batch gives the DataFrames
+    # of process_folder2 (files, statements, balances, transactions, duplicates), which are passed to
+    # on_output or written to <time>_camt053.xlsx in output_path. Statements seen in earlier batches
+    # (and runs, with a manifest) are reported as duplicates (options: see FolderWatcher)
+    if manifest is not None and not isinstance(manifest, ProcessedFilesManifest):
+        manifest = ProcessedFilesManifest(manifest)
+    statement_ids = manifest.statement_ids() if manifest is not None else set()
+
+    def write_output(df_files, df_statements, df_balances, df_transactions, df_duplicates):
+        current_time = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+        file_name = os.path.join(output_path, current_time + '_camt053.xlsx')
+        try:
+            dfs_to_excel(file_name, [df_files, df_statements, df_balances, df_transactions],
+                         sheet_names=['Files', 'Statements', 'Balances', 'Transactions'])
+        except Exception:
+            # a partly written file is removed, the batch is written again when it is retried
+            if os.path.exists(file_name):
+                os.remove(file_name)
+            raise
+
+    if on_output is None:
+        if output_path is None:
+            raise ValueError('output_path or on_output is required')
+        on_output = write_output
+
+    def process_batch(batch):
+        nonlocal statement_ids
+        parsed = [(os.path.basename(path), path, (camt, None)) for path, camt in batch]
+        results, new_ids = collect_camt053_results(parsed, statement_ids, manifest)
+        try:
+            on_output(*results)
+        except Exception:
+            if manifest is not None:
+                manifest.rollback()
+            raise
+        if manifest is not None:
+            manifest.commit()
+        statement_ids = new_ids
+
+    options.setdefault('suffixes', ('.xml',))
+    parse_file = partial(parse_camt053_file, minor_units=minor_units)
+    return FolderWatcher(folder, archive_folder, parse_file, process_batch, **options)
@@ -10,7 +10,7 @@ setup(
     author_email='khorevkp@gmail.com',
     description='Tools for finance and treasury specialists',
     url='https://github.com/khorevkp/KK_Tools',
-    install_requires=['pandas', 'requests', 'lxml', 'xlsxwriter', 'openpyxl', ],
+    install_requires=['pandas', 'numpy', 'requests', 'lxml', 'xlsxwriter', 'openpyxl', ],
     packages=['kktools'],
     long_description=long_description,
     long_description_content_type='text/markdown'